@@ -0,0 +1,110 @@
+"""
+In-process cache for validated access tokens.
+
+Maps a bearer token to its decoded payload and the resolved user row so that
+repeated requests with the same token skip JWT verification and the user
+lookup. Entries live for at most AUTH_JWT_CACHE_TTL seconds and never past
+the token's own `exp` claim.
+
+Only successful validations and structurally malformed tokens are cached.
+Signature/expiry failures are never cached.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from cachetools import TTLCache
+
+DEFAULT_TTL_S = 5.0
+DEFAULT_MAX_ENTRIES = 10_000
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def cache_ttl_s() -> float:
+    """
+    AUTH_JWT_CACHE_TTL: seconds to keep a validated token (0 disables the cache).
+    """
+    return max(0.0, _env_float("AUTH_JWT_CACHE_TTL", DEFAULT_TTL_S))
+
+
+def cache_max_entries() -> int:
+    return max(1, _env_int("AUTH_JWT_CACHE_MAX", DEFAULT_MAX_ENTRIES))
+
+
+@dataclass(frozen=True)
+class CachedToken:
+    payload: dict[str, Any] | None
+    user_row: dict | None
+    expires_at: float
+    # Set for structurally invalid tokens (negative entry).
+    error: str | None = None
+
+
+_TTL_S = cache_ttl_s()
+_cache: TTLCache = TTLCache(maxsize=cache_max_entries(), ttl=_TTL_S or 1.0)
+
+
+def _key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+
+def get(token: str) -> CachedToken | None:
+    if not _TTL_S:
+        return None
+    key = _key(token)
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    if entry.expires_at <= time.time():
+        _cache.pop(key, None)
+        return None
+    return entry
+
+
+def put(token: str, *, payload: dict[str, Any], user_row: dict) -> None:
+    if not _TTL_S:
+        return None
+    expires_at = time.time() + _TTL_S
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        expires_at = min(expires_at, float(exp))
+    _cache[_key(token)] = CachedToken(payload=payload, user_row=user_row, expires_at=expires_at)
+
+
+def put_invalid(token: str, *, error: str) -> None:
+    if not _TTL_S:
+        return None
+    _cache[_key(token)] = CachedToken(
+        payload=None,
+        user_row=None,
+        expires_at=time.time() + _TTL_S,
+        error=error,
+    )
+
+
+def clear() -> None:
+    _cache.clear()
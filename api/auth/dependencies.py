@@ -10,6 +10,12 @@ from . import service
 
 
 def _extract_bearer_token(authorization: str | None) -> str:
+    # Fast path for the common "Bearer <token>" form.
+    if authorization and len(authorization) > 7 and authorization[:7].lower() == "bearer ":
+        token = authorization[7:].strip()
+        if token:
+            return token
+
     raw = (authorization or "").strip()
     if not raw:
         raise HTTPException(
@@ -39,3 +45,7 @@ async def get_bearer_token(authorization: str | None = Header(default=None)) ->
 
 async def get_current_user(access_token: str = Depends(get_bearer_token)) -> dict:
     return await service.get_user_from_access_token(access_token)
+
+
+async def get_current_user_id(access_token: str = Depends(get_bearer_token)) -> int:
+    return await service.get_user_id_from_access_token(access_token)
@@ -6,52 +6,77 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 
+import asyncpg
+from cachetools import TTLCache
+
 try:
     from core import db
 except ModuleNotFoundError: 
     from api.core import db
 
 
+# Short-lived cache for get_user_by_id; the TTL bounds how stale `is_active` can be.
+_USER_CACHE: TTLCache = TTLCache(maxsize=4096, ttl=2)
+
+
+def invalidate_user_cache(user_id: int) -> None:
+    _USER_CACHE.pop(user_id, None)
+
+
 def normalize_email(email: str) -> str:
     return (email or "").strip().lower()
 
 
-async def create_user(*, email: str, password_hash: str, is_active: bool = True) -> dict:
-    row = await db.fetch_one(
+async def create_user(*, email: str, password_hash: str, is_active: bool = True) -> dict | None:
+    """
+    Insert a user. Returns None when the email is already registered
+    (conflict on the unique lower(email) index).
+    """
+    return await db.fetch_one(
         """
         INSERT INTO users (email, password_hash, is_active)
         VALUES ($1, $2, $3)
+        ON CONFLICT ((lower(email))) DO NOTHING
         RETURNING id, email, is_active, created_at, updated_at
         """,
         normalize_email(email),
         password_hash,
         is_active,
     )
-    if row is None:
-        raise RuntimeError("Failed to create user.")
-    return row
 
 
-async def get_user_by_email(email: str) -> dict | None:
-    return await db.fetch_one(
+async def get_user_by_email(email: str) -> asyncpg.Record | None:
+    return await db.fetch_record(
         """
         SELECT id, email, password_hash, is_active, created_at, updated_at
         FROM users
-        WHERE lower(email) = lower($1)
+        WHERE lower(email) = $1
         """,
         normalize_email(email),
     )
 
 
-async def get_user_by_id(user_id: int) -> dict | None:
-    return await db.fetch_one(
-        """
-        SELECT id, email, password_hash, is_active, created_at, updated_at
-        FROM users
-        WHERE id = $1
-        """,
+_GET_USER_BY_ID_SQL = db.hot_query(
+    """
+    SELECT id, email, password_hash, is_active, created_at, updated_at
+    FROM users
+    WHERE id = $1
+    """
+)
+
+
+async def get_user_by_id(user_id: int) -> asyncpg.Record | None:
+    row = _USER_CACHE.get(user_id)
+    if row is not None:
+        return row
+
+    row = await db.fetch_record(
+        _GET_USER_BY_ID_SQL,
         user_id,
     )
+    if row is not None:
+        _USER_CACHE[user_id] = row
+    return row
 
 
 async def insert_refresh_token(
@@ -83,26 +108,66 @@ async def insert_refresh_token(
     return row
 
 
-async def get_refresh_token_by_hash(token_hash: str) -> dict | None:
+async def rotate_refresh_token(
+    *,
+    old_token_id: int,
+    token_hash: str,
+    expires_at: datetime,
+    user_agent: str | None = None,
+    ip_address: str | None = None,
+) -> dict | None:
+    """
+    Replace a refresh token in one round-trip: insert the new token, then mark
+    the old one used + revoked and point it at its replacement.
+
+    Returns the new token row, or None when the old token is already revoked
+    (e.g. a concurrent refresh won the race).
+    """
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+
     return await db.fetch_one(
         """
+        WITH inserted AS (
+          INSERT INTO refresh_tokens (user_id, token_hash, expires_at, user_agent, ip_address)
+          SELECT t.user_id, $2, $3, $4, $5
+          FROM refresh_tokens t
+          WHERE t.id = $1
+            AND t.revoked_at IS NULL
+          FOR UPDATE
+          RETURNING id, user_id, token_hash, expires_at, revoked_at,
+                    replaced_by_token_id, created_at, last_used_at, user_agent, ip_address
+        ),
+        rotated AS (
+          UPDATE refresh_tokens t
+          SET revoked_at = now(),
+              last_used_at = now(),
+              replaced_by_token_id = inserted.id
+          FROM inserted
+          WHERE t.id = $1
+          RETURNING t.id
+        )
         SELECT id, user_id, token_hash, expires_at, revoked_at,
                replaced_by_token_id, created_at, last_used_at, user_agent, ip_address
-        FROM refresh_tokens
-        WHERE token_hash = $1
+        FROM inserted
         """,
+        old_token_id,
         token_hash,
+        expires_at,
+        user_agent,
+        ip_address,
     )
 
 
-async def mark_refresh_token_used(token_id: int) -> None:
-    await db.execute(
+async def get_refresh_token_by_hash(token_hash: str) -> asyncpg.Record | None:
+    return await db.fetch_record(
         """
-        UPDATE refresh_tokens
-        SET last_used_at = now()
-        WHERE id = $1
+        SELECT id, user_id, token_hash, expires_at, revoked_at,
+               replaced_by_token_id, created_at, last_used_at, user_agent, ip_address
+        FROM refresh_tokens
+        WHERE token_hash = $1
         """,
-        token_id,
+        token_hash,
     )
 
 
@@ -135,6 +200,7 @@ async def revoke_refresh_token_by_id(token_id: int) -> bool:
 
 
 async def revoke_all_refresh_tokens_for_user(user_id: int) -> None:
+    invalidate_user_cache(user_id)
     await db.execute(
         """
         UPDATE refresh_tokens
@@ -144,15 +210,3 @@ async def revoke_all_refresh_tokens_for_user(user_id: int) -> None:
         """,
         user_id,
     )
-
-
-async def set_refresh_token_replacement(*, old_token_id: int, new_token_id: int) -> None:
-    await db.execute(
-        """
-        UPDATE refresh_tokens
-        SET replaced_by_token_id = $2
-        WHERE id = $1
-        """,
-        old_token_id,
-        new_token_id,
-    )
@@ -1,23 +1,45 @@
 """
 Auth security helpers.
+
+JWT/refresh-token settings are read from the environment once per process
+(memoized); changing them requires a restart.
 """
 
 from __future__ import annotations
 
+import base64
 import hashlib
 import os
 import secrets
 import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
 from typing import Any
 
+import anyio
 import bcrypt
 import jwt
 
 
+# Password hashing is CPU-bound and releases the GIL; run it on a dedicated
+# set of worker threads so concurrent logins use multiple cores without
+# starving the default thread pool that FastAPI uses for sync endpoints.
+_HASH_LIMITER = anyio.CapacityLimiter(min(8, os.cpu_count() or 4))
+
+# Reused encoder/decoder; avoids the module-level wrapper re-dispatch per call.
+_JWT = jwt.PyJWT()
+
+
 class AuthSecurityError(RuntimeError):
     pass
 
 
+class MalformedTokenError(AuthSecurityError):
+    """
+    Token could not be parsed at all (as opposed to a bad signature or expiry).
+    """
+
+
 def _env_int(name: str, default: int) -> int:
     raw = os.environ.get(name, "").strip()
     if not raw:
@@ -28,20 +50,35 @@ def _env_int(name: str, default: int) -> int:
         return default
 
 
+@lru_cache(maxsize=1)
 def jwt_secret() -> str:
     # Local default keeps development simple.
     # In production, set JWT_SECRET in environment.
     return os.environ.get("JWT_SECRET", "dev-change-this-secret").strip() or "dev-change-this-secret"
 
 
+@lru_cache(maxsize=1)
+def _jwt_key() -> bytes:
+    # Encode the secret once instead of on every sign/verify.
+    return jwt_secret().encode("utf-8")
+
+
+@lru_cache(maxsize=1)
+def _jwt_algorithms() -> tuple[str, ...]:
+    return (jwt_algorithm(),)
+
+
+@lru_cache(maxsize=1)
 def jwt_algorithm() -> str:
     return os.environ.get("JWT_ALG", "HS256").strip() or "HS256"
 
 
+@lru_cache(maxsize=1)
 def access_token_expire_minutes() -> int:
     return _env_int("ACCESS_TOKEN_EXPIRE_MIN", 15)
 
 
+@lru_cache(maxsize=1)
 def refresh_token_expire_days() -> int:
     return _env_int("REFRESH_TOKEN_EXPIRE_DAYS", 30)
 
@@ -50,22 +87,127 @@ def now_epoch_s() -> int:
     return int(time.time())
 
 
-def hash_password(plain_password: str) -> str:
+def password_hash_algorithm() -> str:
+    """
+    AUTH_HASH_ALG: "bcrypt" (default) or "argon2". Only affects new hashes;
+    existing hashes are verified with whatever algorithm produced them.
+    """
+    return os.environ.get("AUTH_HASH_ALG", "bcrypt").strip().lower() or "bcrypt"
+
+
+class PasswordHasher(ABC):
+    # PHC/modular-crypt prefixes this hasher recognizes.
+    prefixes: tuple[str, ...] = ()
+
+    @abstractmethod
+    def hash(self, password: bytes) -> str: ...
+
+    @abstractmethod
+    def verify(self, password: bytes, password_hash: str) -> bool: ...
+
+
+class BcryptHasher(PasswordHasher):
+    prefixes = ("$2a$", "$2b$", "$2y$")
+
+    def hash(self, password: bytes) -> str:
+        return bcrypt.hashpw(password, bcrypt.gensalt()).decode("utf-8")
+
+    def verify(self, password: bytes, password_hash: str) -> bool:
+        try:
+            return bcrypt.checkpw(password, password_hash.encode("utf-8"))
+        except ValueError:
+            return False
+
+
+class Argon2Hasher(PasswordHasher):
+    prefixes = ("$argon2id$", "$argon2i$", "$argon2d$")
+
+    def __init__(self) -> None:
+        from argon2 import PasswordHasher as _Argon2PasswordHasher
+
+        self._hasher = _Argon2PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=2)
+
+    def hash(self, password: bytes) -> str:
+        return self._hasher.hash(password)
+
+    def verify(self, password: bytes, password_hash: str) -> bool:
+        from argon2.exceptions import InvalidHashError, VerificationError
+
+        try:
+            return self._hasher.verify(password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+
+
+@lru_cache(maxsize=None)
+def _hasher(name: str) -> PasswordHasher:
+    if name == "argon2":
+        return Argon2Hasher()
+    if name == "bcrypt":
+        return BcryptHasher()
+    raise AuthSecurityError(f"Unsupported AUTH_HASH_ALG: {name}")
+
+
+def password_hasher() -> PasswordHasher:
+    return _hasher(password_hash_algorithm())
+
+
+def _hasher_for_hash(password_hash: str) -> PasswordHasher | None:
+    if password_hash.startswith(Argon2Hasher.prefixes):
+        return _hasher("argon2")
+    if password_hash.startswith(BcryptHasher.prefixes):
+        return _hasher("bcrypt")
+    return None
+
+
+def _hash_password_sync(plain_password: str) -> str:
     password = (plain_password or "").encode("utf-8")
     if not password:
         raise AuthSecurityError("Password is empty.")
-    return bcrypt.hashpw(password, bcrypt.gensalt()).decode("utf-8")
+    return password_hasher().hash(password)
 
 
-def verify_password(plain_password: str, password_hash: str) -> bool:
+def _verify_password_sync(plain_password: str, password_hash: str) -> bool:
     password = (plain_password or "").encode("utf-8")
-    hashed = (password_hash or "").encode("utf-8")
-    if not password or not hashed:
+    password_hash = password_hash or ""
+    if not password or not password_hash:
         return False
-    try:
-        return bcrypt.checkpw(password, hashed)
-    except ValueError:
+    hasher = _hasher_for_hash(password_hash)
+    if hasher is None:
         return False
+    return hasher.verify(password, password_hash)
+
+
+@lru_cache(maxsize=1)
+def _dummy_password_hash() -> str:
+    return password_hasher().hash(secrets.token_bytes(16))
+
+
+def _verify_dummy_password_sync(plain_password: str) -> None:
+    _verify_password_sync(plain_password or "-", _dummy_password_hash())
+
+
+async def hash_password(plain_password: str) -> str:
+    return await anyio.to_thread.run_sync(_hash_password_sync, plain_password, limiter=_HASH_LIMITER)
+
+
+async def verify_password(plain_password: str, password_hash: str) -> bool:
+    return await anyio.to_thread.run_sync(
+        _verify_password_sync,
+        plain_password,
+        password_hash,
+        limiter=_HASH_LIMITER,
+    )
+
+
+async def verify_dummy_password(plain_password: str) -> None:
+    """
+    Spend the same work as a real password check against a throwaway hash.
+
+    Used when the account does not exist, so response time does not reveal
+    whether an email is registered.
+    """
+    await anyio.to_thread.run_sync(_verify_dummy_password_sync, plain_password, limiter=_HASH_LIMITER)
 
 
 def build_access_token(*, user_id: int, email: str) -> str:
@@ -74,12 +216,14 @@ def build_access_token(*, user_id: int, email: str) -> str:
 
     payload = {
         "sub": str(user_id),
+        # Integer copy of `sub` so the hot auth path can skip string parsing.
+        "uid": int(user_id),
         "email": email,
         "type": "access",
         "iat": issued_at,
         "exp": expires_at,
     }
-    return jwt.encode(payload, jwt_secret(), algorithm=jwt_algorithm())
+    return _JWT.encode(payload, _jwt_key(), algorithm=jwt_algorithm())
 
 
 def decode_access_token(token: str) -> dict[str, Any]:
@@ -88,7 +232,11 @@ def decode_access_token(token: str) -> dict[str, Any]:
         raise AuthSecurityError("Access token is empty.")
 
     try:
-        payload = jwt.decode(raw, jwt_secret(), algorithms=[jwt_algorithm()])
+        payload = _JWT.decode(raw, _jwt_key(), algorithms=_jwt_algorithms())
+    except jwt.InvalidSignatureError as exc:
+        raise AuthSecurityError("Invalid access token.") from exc
+    except jwt.DecodeError as exc:
+        raise MalformedTokenError("Invalid access token.") from exc
     except jwt.InvalidTokenError as exc:
         raise AuthSecurityError("Invalid access token.") from exc
 
@@ -99,12 +247,42 @@ def decode_access_token(token: str) -> dict[str, Any]:
     return payload
 
 
-def build_refresh_token() -> str:
-    # URL-safe random string for client storage/transmission.
-    return secrets.token_urlsafe(48)
+def build_refresh_token() -> tuple[bytes, str]:
+    """
+    Returns (token_bytes, token_str) for a new URL-safe random refresh token.
+
+    token_bytes is the ASCII form that gets hashed; token_str goes to the
+    client. Same format as secrets.token_urlsafe(48).
+    """
+    token_bytes = base64.urlsafe_b64encode(secrets.token_bytes(48)).rstrip(b"=")
+    return token_bytes, token_bytes.decode("ascii")
+
+
+@lru_cache(maxsize=1)
+def _refresh_hash_key() -> bytes:
+    # BLAKE2b keys are capped at 64 bytes; derive a fixed-size key from the secret.
+    return hashlib.sha256(_jwt_key()).digest()
+
+
+def hash_refresh_token(raw_refresh_token: str | bytes) -> str:
+    """
+    Keyed BLAKE2b digest used as the server-side lookup key for a refresh token.
+
+    Accepts the token as sent by the client (str) or as returned by
+    build_refresh_token (bytes); both hash identically.
+    """
+    token = raw_refresh_token if isinstance(raw_refresh_token, bytes) else (raw_refresh_token or "").encode("utf-8")
+    if not token:
+        raise AuthSecurityError("Refresh token is empty.")
+    return hashlib.blake2b(token, digest_size=32, key=_refresh_hash_key()).hexdigest()
+
 
+def legacy_hash_refresh_token(raw_refresh_token: str) -> str:
+    """
+    Unkeyed SHA-256 digest used before the switch to BLAKE2b.
 
-def hash_refresh_token(raw_refresh_token: str) -> str:
+    Only used to look up refresh tokens issued before that change.
+    """
     token = (raw_refresh_token or "").encode("utf-8")
     if not token:
         raise AuthSecurityError("Refresh token is empty.")
@@ -8,7 +8,7 @@ from datetime import datetime, timedelta, timezone
 
 from fastapi import HTTPException, status
 
-from . import repository, schemas, security
+from . import cache, repository, schemas, security
 
 
 def _utc_now() -> datetime:
@@ -24,6 +24,15 @@ def _to_user_response(user_row: dict) -> schemas.UserResponse:
     )
 
 
+async def _find_refresh_token(raw_refresh_token: str) -> dict | None:
+    row = await repository.get_refresh_token_by_hash(security.hash_refresh_token(raw_refresh_token))
+    if row is None:
+        # Tokens issued before the switch to keyed BLAKE2b hashing; they are
+        # rotated to the new hash on their next refresh.
+        row = await repository.get_refresh_token_by_hash(security.legacy_hash_refresh_token(raw_refresh_token))
+    return row
+
+
 async def _issue_token_pair(
     *,
     user_row: dict,
@@ -35,23 +44,31 @@ async def _issue_token_pair(
     email = str(user_row["email"])
 
     access_token = security.build_access_token(user_id=user_id, email=email)
-    raw_refresh_token = security.build_refresh_token()
-    refresh_hash = security.hash_refresh_token(raw_refresh_token)
+    refresh_token_bytes, raw_refresh_token = security.build_refresh_token()
+    refresh_hash = security.hash_refresh_token(refresh_token_bytes)
     expires_at = _utc_now() + timedelta(days=security.refresh_token_expire_days())
 
-    refresh_row = await repository.insert_refresh_token(
-        user_id=user_id,
-        token_hash=refresh_hash,
-        expires_at=expires_at,
-        user_agent=user_agent,
-        ip_address=ip_address,
-    )
-
-    if replaced_token_id is not None:
-        await repository.set_refresh_token_replacement(
+    if replaced_token_id is None:
+        await repository.insert_refresh_token(
+            user_id=user_id,
+            token_hash=refresh_hash,
+            expires_at=expires_at,
+            user_agent=user_agent,
+            ip_address=ip_address,
+        )
+    else:
+        rotated = await repository.rotate_refresh_token(
             old_token_id=replaced_token_id,
-            new_token_id=int(refresh_row["id"]),
+            token_hash=refresh_hash,
+            expires_at=expires_at,
+            user_agent=user_agent,
+            ip_address=ip_address,
         )
+        if rotated is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token is revoked.",
+            )
 
     return schemas.TokenPairResponse(
         access_token=access_token,
@@ -65,16 +82,14 @@ async def register(
     user_agent: str | None = None,
     ip_address: str | None = None,
 ) -> schemas.AuthResponse:
-    existing = await repository.get_user_by_email(payload.email)
-    if existing is not None:
+    password_hash = await security.hash_password(payload.password)
+    user_row = await repository.create_user(email=payload.email, password_hash=password_hash)
+    if user_row is None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Email is already registered.",
         )
 
-    password_hash = security.hash_password(payload.password)
-    user_row = await repository.create_user(email=payload.email, password_hash=password_hash)
-
     tokens = await _issue_token_pair(
         user_row=user_row,
         user_agent=user_agent,
@@ -92,6 +107,7 @@ async def login(
 ) -> schemas.AuthResponse:
     user_row = await repository.get_user_by_email(payload.email)
     if user_row is None:
+        await security.verify_dummy_password(payload.password)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password.",
@@ -103,7 +119,7 @@ async def login(
             detail="User is inactive.",
         )
 
-    is_valid = security.verify_password(payload.password, str(user_row.get("password_hash") or ""))
+    is_valid = await security.verify_password(payload.password, str(user_row.get("password_hash") or ""))
     if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -132,8 +148,7 @@ async def refresh_tokens(
             detail="refresh_token is required.",
         )
 
-    incoming_hash = security.hash_refresh_token(incoming_refresh)
-    old_token_row = await repository.get_refresh_token_by_hash(incoming_hash)
+    old_token_row = await _find_refresh_token(incoming_refresh)
     if old_token_row is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -163,9 +178,6 @@ async def refresh_tokens(
             detail="Invalid refresh token owner.",
         )
 
-    await repository.mark_refresh_token_used(int(old_token_row["id"]))
-    await repository.revoke_refresh_token_by_id(int(old_token_row["id"]))
-
     return await _issue_token_pair(
         user_row=user_row,
         user_agent=user_agent,
@@ -183,7 +195,8 @@ async def logout(
     refresh_token = (payload.refresh_token or "").strip()
     if refresh_token:
         token_hash = security.hash_refresh_token(refresh_token)
-        await repository.revoke_refresh_token_by_hash(token_hash)
+        if not await repository.revoke_refresh_token_by_hash(token_hash):
+            await repository.revoke_refresh_token_by_hash(security.legacy_hash_refresh_token(refresh_token))
         return {"ok": True}
 
     # If token is not provided, but user is authenticated, revoke all sessions.
@@ -197,23 +210,21 @@ async def logout(
     )
 
 
-async def get_user_from_access_token(access_token: str) -> dict:
-    try:
-        payload = security.decode_access_token(access_token)
-    except security.AuthSecurityError as exc:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=str(exc),
-        ) from exc
-
+def _payload_user_id(payload: dict) -> int:
+    user_id = payload.get("uid")
+    if type(user_id) is int:
+        return user_id
+    # Tokens issued before the `uid` claim only carry `sub`.
     subject = str(payload.get("sub") or "").strip()
     if not subject.isdigit():
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid access token subject.",
         )
+    return int(subject)
 
-    user_row = await repository.get_user_by_id(int(subject))
+
+def _check_user_row(user_row: dict | None) -> None:
     if user_row is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -224,9 +235,56 @@ async def get_user_from_access_token(access_token: str) -> dict:
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User is inactive.",
         )
+
+
+async def get_user_from_access_token(access_token: str) -> dict:
+    cached = cache.get(access_token)
+    if cached is not None:
+        if cached.error is not None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=cached.error,
+            )
+        return cached.user_row
+
+    try:
+        payload = security.decode_access_token(access_token)
+    except security.MalformedTokenError as exc:
+        cache.put_invalid(access_token, error=str(exc))
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(exc),
+        ) from exc
+    except security.AuthSecurityError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(exc),
+        ) from exc
+
+    user_id = _payload_user_id(payload)
+    user_row = await repository.get_user_by_id(user_id)
+    _check_user_row(user_row)
+
+    cache.put(access_token, payload=payload, user_row=user_row)
     return user_row
 
 
+async def get_user_id_from_access_token(access_token: str) -> int:
+    """
+    Resolve only the caller's id. A cached token supplies it from its `uid`
+    claim; `is_active` is re-checked against the user row cache instead of
+    the row stored with the token.
+    """
+    cached = cache.get(access_token)
+    if cached is None or cached.error is not None:
+        user_row = await get_user_from_access_token(access_token)
+        return int(user_row["id"])
+
+    user_id = _payload_user_id(cached.payload)
+    _check_user_row(await repository.get_user_by_id(user_id))
+    return user_id
+
+
 async def me(access_token: str) -> schemas.UserResponse:
     user_row = await get_user_from_access_token(access_token)
     return _to_user_response(user_row)
@@ -11,13 +11,88 @@ SQL parameter style:
 from __future__ import annotations
 
 import os
+import re
+import struct
+import sys
+from array import array
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
 from typing import Any
 from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import asyncpg
+import orjson
 
 _pool: asyncpg.Pool | None = None
 
+# SQL (with its parameter count) warmed on every new pool connection (see hot_query).
+_HOT_QUERIES: list[tuple[str, int]] = []
+
+_PARAM_RE = re.compile(r"\$(\d+)")
+
+# Record -> dict converters specialized per result column list (see make_mapper).
+_MAPPERS: dict[tuple[str, ...], Callable[[asyncpg.Record], dict[str, Any]]] = {}
+
+DEFAULT_POOL_MIN_SIZE = 10
+DEFAULT_POOL_MAX_SIZE = 20
+DEFAULT_STATEMENT_CACHE_SIZE = 1024
+DEFAULT_HNSW_EF_SEARCH = 100
+DEFAULT_HNSW_ITERATIVE_SCAN = "strict_order"
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def pool_sizes() -> tuple[int, int]:
+    """
+    Returns (min_size, max_size) from PG_POOL_MIN / PG_POOL_MAX.
+
+    asyncpg opens min_size connections when the pool is created, so startup
+    pays the connect/auth cost instead of the first requests.
+    """
+    max_size = max(1, _env_int("PG_POOL_MAX", DEFAULT_POOL_MAX_SIZE))
+    min_size = max(0, min(_env_int("PG_POOL_MIN", DEFAULT_POOL_MIN_SIZE), max_size))
+    return min_size, max_size
+
+
+def statement_cache_size() -> int:
+    """
+    PG_STATEMENT_CACHE_SIZE: prepared statements kept per connection.
+
+    Set it to 0 behind PgBouncer in transaction pooling mode, where a
+    statement prepared on one server connection is not visible on the next.
+    """
+    return max(0, _env_int("PG_STATEMENT_CACHE_SIZE", DEFAULT_STATEMENT_CACHE_SIZE))
+
+
+def hnsw_server_settings() -> dict[str, str]:
+    """
+    pgvector HNSW search settings, sent as connection startup parameters so
+    they survive the pool's RESET ALL and cost nothing per query.
+
+    - PG_HNSW_EF_SEARCH (default 100, 0 leaves the server default of 40):
+      candidates an index scan visits. It must be at least the LIMIT of a
+      vector query, or the query returns fewer rows than asked for.
+    - PG_HNSW_ITERATIVE_SCAN (default strict_order, empty to leave unset):
+      pgvector >= 0.8 keeps scanning the index when filters (user, model)
+      drop candidates. Older pgvector ignores it with a server warning.
+    """
+    settings: dict[str, str] = {}
+    ef_search = max(0, _env_int("PG_HNSW_EF_SEARCH", DEFAULT_HNSW_EF_SEARCH))
+    if ef_search:
+        settings["hnsw.ef_search"] = str(ef_search)
+    iterative_scan = os.environ.get("PG_HNSW_ITERATIVE_SCAN", DEFAULT_HNSW_ITERATIVE_SCAN).strip()
+    if iterative_scan:
+        settings["hnsw.iterative_scan"] = iterative_scan
+    return settings
+
 
 def _sanitize_database_url(url: str) -> str:
     parts = urlsplit(url)
@@ -36,15 +111,118 @@ def database_url() -> str:
     return _sanitize_database_url(url)
 
 
+_VECTOR_HEADER = struct.Struct(">HH")
+
+
+def _encode_vector(value: Any) -> bytes:
+    """
+    pgvector binary format: uint16 dim, uint16 unused, dim x float32 (big-endian).
+    """
+    arr = array("f", value)
+    if sys.byteorder == "little":
+        arr.byteswap()
+    return _VECTOR_HEADER.pack(len(arr), 0) + arr.tobytes()
+
+
+def _decode_vector(data: bytes) -> list[float]:
+    dim, _unused = _VECTOR_HEADER.unpack_from(data)
+    arr = array("f")
+    arr.frombytes(data[_VECTOR_HEADER.size : _VECTOR_HEADER.size + 4 * dim])
+    if sys.byteorder == "little":
+        arr.byteswap()
+    return arr.tolist()
+
+
+# jsonb binary format: a version byte (1) followed by the JSON text.
+_JSONB_VERSION = b"\x01"
+
+
+def _encode_jsonb(value: Any) -> bytes:
+    return _JSONB_VERSION + orjson.dumps(value)
+
+
+def _decode_jsonb(data: bytes) -> Any:
+    return orjson.loads(memoryview(data)[1:])
+
+
+def hot_query(sql: str) -> str:
+    """
+    Register `sql` to be run once as soon as a pool connection opens, so the
+    statement is already in asyncpg's statement cache and the first request
+    that runs it skips the PREPARE round-trip and type introspection.
+    Returns `sql` unchanged; callers must pass this exact string to fetch/execute.
+    """
+    n_params = max((int(n) for n in _PARAM_RE.findall(sql)), default=0)
+    _HOT_QUERIES.append((sql, n_params))
+    return sql
+
+
+async def _prewarm_statements(conn: asyncpg.Connection) -> None:
+    # fetch/execute only consult the cache they fill themselves (prepare()
+    # does not), so run each query for real. Every parameter is NULL, which
+    # makes the `col = $n` filters match nothing, and the transaction is
+    # rolled back, so writes never land. Execution errors (e.g. a NULL into
+    # a NOT NULL column) come after the statement is cached.
+    for sql, n_params in _HOT_QUERIES:
+        tr = conn.transaction()
+        await tr.start()
+        try:
+            await conn.execute(sql, *([None] * n_params))
+        except asyncpg.PostgresError:
+            # Either the warm-up run failed after PREPARE (still cached), or
+            # the schema is not migrated yet and the query prepares on first use.
+            pass
+        finally:
+            await tr.rollback()
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    # jsonb parameters take Python objects and columns come back decoded,
+    # serialized once with orjson instead of json.dumps + a text cast.
+    await conn.set_type_codec(
+        "jsonb",
+        schema="pg_catalog",
+        encoder=_encode_jsonb,
+        decoder=_decode_jsonb,
+        format="binary",
+    )
+    # Send/receive pgvector values in binary instead of formatting and
+    # re-parsing ~768 decimal floats per vector.
+    try:
+        await conn.set_type_codec(
+            "vector",
+            schema="public",
+            encoder=_encode_vector,
+            decoder=_decode_vector,
+            format="binary",
+        )
+    except ValueError:
+        # The vector extension is not installed yet (migrations not applied).
+        pass
+
+    # After the codecs: registering a codec drops cached statements.
+    if statement_cache_size() > 0:
+        await _prewarm_statements(conn)
+
+
 async def init_pool() -> None:
     global _pool
     if _pool is not None:
         return None
+    min_size, max_size = pool_sizes()
     _pool = await asyncpg.create_pool(
         dsn=database_url(),
-        min_size=1,
-        max_size=5,
+        min_size=min_size,
+        max_size=max_size,
+        max_inactive_connection_lifetime=300,
         command_timeout=30,
+        # asyncpg prepares every query and caches the statement per connection,
+        # keyed by SQL text, so repository queries (fixed string literals) are
+        # parsed and planned once per connection. Keep room for all of them.
+        statement_cache_size=statement_cache_size(),
+        max_cached_statement_lifetime=0,
+        server_settings=hnsw_server_settings(),
+        init=_init_connection,
     )
 
 
@@ -66,6 +244,22 @@ def _record_to_dict(record: asyncpg.Record) -> dict[str, Any]:
     return dict(record)
 
 
+def make_mapper(columns: tuple[str, ...]) -> Callable[[asyncpg.Record], dict[str, Any]]:
+    """
+    Return a Record -> dict converter specialized for a fixed column list.
+
+    The converter is generated once per distinct column list as
+    `lambda r: {"id": r[0], "email": r[1], ...}`, which avoids the generic
+    mapping protocol that dict(record) goes through for every row.
+    """
+    mapper = _MAPPERS.get(columns)
+    if mapper is None:
+        body = ", ".join(f"{name!r}: r[{i}]" for i, name in enumerate(columns))
+        mapper = eval(f"lambda r: {{{body}}}")
+        _MAPPERS[columns] = mapper
+    return mapper
+
+
 async def fetch_one(sql: str, *args: Any) -> dict[str, Any] | None:
     """
     Run a query and return a single row as a dict (or None).
@@ -75,12 +269,41 @@ async def fetch_one(sql: str, *args: Any) -> dict[str, Any] | None:
     return _record_to_dict(row) if row is not None else None
 
 
+async def fetch_record(sql: str, *args: Any) -> asyncpg.Record | None:
+    """
+    Like fetch_one, but return the asyncpg.Record as-is (no dict copy).
+
+    Records support mapping access (row["col"], row.get("col")), which is all
+    hot-path callers need.
+    """
+    return await pool().fetchrow(sql, *args)
+
+
+def records_to_dicts(rows: list[asyncpg.Record]) -> list[dict[str, Any]]:
+    if not rows:
+        return []
+    mapper = make_mapper(tuple(rows[0].keys()))
+    return [mapper(r) for r in rows]
+
+
 async def fetch_all(sql: str, *args: Any) -> list[dict[str, Any]]:
     """
     Run a query and return all rows as a list of dicts.
     """
-    rows = await pool().fetch(sql, *args)
-    return [_record_to_dict(r) for r in rows]
+    return records_to_dicts(await pool().fetch(sql, *args))
+
+
+@asynccontextmanager
+async def transaction() -> AsyncIterator[asyncpg.Connection]:
+    """
+    Acquire a pooled connection and run the block inside a transaction.
+
+    Use this when statements must share a connection, e.g. SET LOCAL /
+    set_config(..., true) settings that only apply to the current transaction.
+    """
+    async with pool().acquire() as conn:
+        async with conn.transaction():
+            yield conn
 
 
 async def execute(sql: str, *args: Any) -> None:
@@ -3,20 +3,71 @@ Ollama HTTP client helpers.
 
 Used endpoints:
 - POST /api/embeddings  -> {"embedding": [float, ...]}
-- POST /api/chat        -> {"message": {"role": "assistant", "content": "..."}}
+- POST /api/embed       -> {"embeddings": [[float, ...], ...]} (batch input)
+- POST /api/chat        -> NDJSON stream of {"message": {"role": "assistant", "content": "..."}, "done": ...}
+- POST /api/pull        -> NDJSON stream of {"status": "...", "digest"?, "total"?, "completed"?}
 """
 
 from __future__ import annotations
 
+import asyncio
+from array import array
+from collections.abc import AsyncIterator
 from typing import Any
 
 import httpx
+import orjson
+
+_client: httpx.AsyncClient | None = None
+
+_JSON_HEADERS = {"content-type": "application/json"}
+
 
 # Ollama failures are explicit and separable from other runtime errors.
 class OllamaError(RuntimeError):
     pass
 
 
+def init_client() -> httpx.AsyncClient:
+    """
+    Create the shared keep-alive client for all Ollama calls.
+
+    FastAPI calls this on startup and `close_client()` on shutdown (see
+    `api/main.py`). Callers pass absolute URLs and a per-request timeout.
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0),
+            limits=httpx.Limits(
+                max_keepalive_connections=40,
+                max_connections=100,
+                keepalive_expiry=30.0,
+            ),
+        )
+    return _client
+
+
+def get_client() -> httpx.AsyncClient:
+    # Falls back to lazy creation for scripts that don't run the app lifespan.
+    return _client if _client is not None else init_client()
+
+
+async def close_client() -> None:
+    global _client
+    if _client is None:
+        return None
+    await _client.aclose()
+    _client = None
+
+
+def _loads(content: bytes) -> Any:
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError as e:
+        raise OllamaError("Ollama returned invalid JSON.") from e
+
+
 def _normalize_base_url(base_url: str) -> str:
     base_url = (base_url or "").strip()
     if not base_url:
@@ -39,29 +90,90 @@ async def embed_text(
     if not model:
         raise OllamaError("Embedding model name is empty.")
 
-    async with httpx.AsyncClient(base_url=base_url, timeout=timeout_s) as client:
-        resp = await client.post(
-            "/api/embeddings",
-            json={"model": model, "prompt": prompt},
-        )
+    resp = await get_client().post(
+        f"{base_url}/api/embeddings",
+        content=orjson.dumps({"model": model, "prompt": prompt}),
+        headers=_JSON_HEADERS,
+        timeout=timeout_s,
+    )
 
     if resp.status_code != 200:
         # Avoid dumping huge bodies; include a small snippet.
         body = resp.text[:500]
         raise OllamaError(f"Ollama embeddings request failed: {resp.status_code} {body}")
 
-    data: dict[str, Any] = resp.json()
+    data: dict[str, Any] = _loads(resp.content)
     emb = data.get("embedding")
     if not isinstance(emb, list) or not emb:
         raise OllamaError("Ollama returned no embedding.")
 
-    # Ensure we return floats.
+    return _float_list(emb)
+
+
+def _float_list(emb: Any) -> list[float]:
+    # Coerced/validated in C, not per element in Python.
     try:
-        return [float(x) for x in emb]
-    except Exception as e:
+        return array("d", emb).tolist()
+    except (TypeError, ValueError, OverflowError) as e:
         raise OllamaError("Ollama returned a non-numeric embedding.") from e
 
 
+async def embed_texts(
+    *,
+    base_url: str,
+    model: str,
+    prompts: list[str],
+    timeout_s: float = 120.0,
+    concurrency: int = 8,
+) -> list[list[float]]:
+    """
+    Create embeddings for several prompts in one request (POST /api/embed).
+
+    Falls back to /api/embeddings calls per prompt (at most `concurrency` in
+    flight) on Ollama versions without the batch endpoint.
+    """
+    if not prompts:
+        return []
+    base_url = _normalize_base_url(base_url)
+    model = (model or "").strip()
+    if not model:
+        raise OllamaError("Embedding model name is empty.")
+
+    resp = await get_client().post(
+        f"{base_url}/api/embed",
+        content=orjson.dumps({"model": model, "input": prompts}),
+        headers=_JSON_HEADERS,
+        timeout=timeout_s,
+    )
+
+    embeddings = None
+    if resp.status_code == 200:
+        data: dict[str, Any] = _loads(resp.content)
+        embeddings = data.get("embeddings")
+    elif resp.status_code != 404:
+        body = resp.text[:500]
+        raise OllamaError(f"Ollama embed request failed: {resp.status_code} {body}")
+
+    if embeddings is None:
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def _one(prompt: str) -> list[float]:
+            async with sem:
+                return await embed_text(base_url=base_url, model=model, prompt=prompt, timeout_s=timeout_s)
+
+        # gather() keeps results in prompt order.
+        return list(await asyncio.gather(*(_one(prompt) for prompt in prompts)))
+
+    if not isinstance(embeddings, list) or len(embeddings) != len(prompts):
+        raise OllamaError("Ollama returned the wrong number of embeddings.")
+    out: list[list[float]] = []
+    for emb in embeddings:
+        if not isinstance(emb, list) or not emb:
+            raise OllamaError("Ollama returned no embedding.")
+        out.append(_float_list(emb))
+    return out
+
+
 async def chat_text(
     *,
     base_url: str,
@@ -86,26 +198,20 @@ async def chat_text(
     )
 
 
-async def chat_messages(
+def _chat_payload(
     *,
-    base_url: str,
     model: str,
     messages: list[dict[str, str]],
-    timeout_s: float = 120.0,
-    temperature: float | None = None,
-    max_output_tokens: int | None = None,
-) -> str:
-    """
-    Generate one assistant message from Ollama chat API using a message list.
-    """
-    base_url = _normalize_base_url(base_url)
+    temperature: float | None,
+    max_output_tokens: int | None,
+) -> dict[str, Any]:
     model = (model or "").strip()
     if not model:
         raise OllamaError("Generation model name is empty.")
     if not messages:
         raise OllamaError("Messages list is empty.")
 
-    payload: dict[str, Any] = {"model": model, "messages": messages, "stream": False}
+    payload: dict[str, Any] = {"model": model, "messages": messages, "stream": True}
     options: dict[str, Any] = {}
     if temperature is not None:
         options["temperature"] = float(temperature)
@@ -113,23 +219,133 @@ async def chat_messages(
         options["num_predict"] = int(max_output_tokens)
     if options:
         payload["options"] = options
+    return payload
 
-    async with httpx.AsyncClient(base_url=base_url, timeout=timeout_s) as client:
-        resp = await client.post("/api/chat", json=payload)
 
-    if resp.status_code != 200:
-        body = resp.text[:500]
-        raise OllamaError(f"Ollama chat request failed: {resp.status_code} {body}")
+async def chat_stream(
+    *,
+    base_url: str,
+    model: str,
+    messages: list[dict[str, str]],
+    timeout_s: float = 120.0,
+    temperature: float | None = None,
+    max_output_tokens: int | None = None,
+) -> AsyncIterator[str]:
+    """
+    Stream assistant content deltas from Ollama chat API as they arrive.
+
+    `timeout_s` bounds each read (the wait for the next line), not the whole
+    answer; callers add the overall limit (see chat_messages()). httpx errors
+    are raised as OllamaError.
+    """
+    base_url = _normalize_base_url(base_url)
+    payload = _chat_payload(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_output_tokens=max_output_tokens,
+    )
+
+    try:
+        async with get_client().stream(
+            "POST",
+            f"{base_url}/api/chat",
+            content=orjson.dumps(payload),
+            headers=_JSON_HEADERS,
+            timeout=timeout_s,
+        ) as resp:
+            if resp.status_code != 200:
+                body = (await resp.aread()).decode("utf-8", errors="replace")[:500]
+                raise OllamaError(f"Ollama chat request failed: {resp.status_code} {body}")
+
+            async for line in resp.aiter_lines():
+                if not line.strip():
+                    continue
+                data: dict[str, Any] = _loads(line)
+                error = data.get("error")
+                if error:
+                    raise OllamaError(f"Ollama chat stream failed: {error}")
+
+                message = data.get("message")
+                content = message.get("content") if isinstance(message, dict) else data.get("response")
+                if isinstance(content, str) and content:
+                    yield content
+
+                if data.get("done"):
+                    break
+    except httpx.HTTPError as e:
+        raise OllamaError(f"Ollama chat request failed: {e!r}") from e
+
 
-    data: dict[str, Any] = resp.json()
-    message = data.get("message")
-    if isinstance(message, dict):
-        content = message.get("content")
-        if isinstance(content, str) and content.strip():
-            return content.strip()
+async def chat_messages(
+    *,
+    base_url: str,
+    model: str,
+    messages: list[dict[str, str]],
+    timeout_s: float = 120.0,
+    temperature: float | None = None,
+    max_output_tokens: int | None = None,
+) -> str:
+    """
+    Generate one assistant message from Ollama chat API using a message list.
+
+    `timeout_s` caps the whole answer, not just each streamed read.
+    """
+    try:
+        async with asyncio.timeout(timeout_s):
+            parts = [
+                part
+                async for part in chat_stream(
+                    base_url=base_url,
+                    model=model,
+                    messages=messages,
+                    timeout_s=timeout_s,
+                    temperature=temperature,
+                    max_output_tokens=max_output_tokens,
+                )
+            ]
+    except TimeoutError as e:
+        raise OllamaError(f"Ollama chat did not finish within {timeout_s:g}s.") from e
+    content = "".join(parts).strip()
+    if not content:
+        raise OllamaError("Ollama returned an empty chat response.")
+    return content
+
+
+async def pull_stream(
+    *,
+    base_url: str,
+    model: str,
+    timeout_s: float = 600.0,
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Stream download progress from Ollama pull API, one status object per line.
+
+    The last object is {"status": "success"} when the model is installed.
+    `timeout_s` bounds each read, not the whole download. httpx errors are
+    raised as OllamaError.
+    """
+    base_url = _normalize_base_url(base_url)
 
-    response_text = data.get("response")
-    if isinstance(response_text, str) and response_text.strip():
-        return response_text.strip()
+    try:
+        async with get_client().stream(
+            "POST",
+            f"{base_url}/api/pull",
+            content=orjson.dumps({"model": model, "stream": True}),
+            headers=_JSON_HEADERS,
+            timeout=timeout_s,
+        ) as resp:
+            if resp.status_code != 200:
+                body = (await resp.aread()).decode("utf-8", errors="replace")[:500]
+                raise OllamaError(f"Ollama pull request failed: {resp.status_code} {body}")
 
-    raise OllamaError("Ollama returned an empty chat response.")
+            async for line in resp.aiter_lines():
+                if not line.strip():
+                    continue
+                data: dict[str, Any] = _loads(line)
+                error = data.get("error")
+                if error:
+                    raise OllamaError(f"Ollama pull failed: {error}")
+                yield data
+    except httpx.HTTPError as e:
+        raise OllamaError(f"Ollama pull request failed: {e!r}") from e
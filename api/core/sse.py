@@ -0,0 +1,27 @@
+"""
+Server-sent events helpers shared by streaming endpoints.
+"""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+from typing import Any
+
+import orjson
+from fastapi.responses import StreamingResponse
+
+
+async def _encode(events: AsyncIterator[tuple[str, dict[str, Any]]]) -> AsyncIterator[bytes]:
+    async for event, data in events:
+        yield b"event: " + event.encode("ascii") + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+def sse_response(events: AsyncIterator[tuple[str, dict[str, Any]]]) -> StreamingResponse:
+    """
+    Stream (event, data) pairs as `text/event-stream`, one frame per pair.
+    """
+    return StreamingResponse(
+        _encode(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -4,14 +4,14 @@ Generation persistence helpers (chat history).
 
 from __future__ import annotations
 
-import json
+from datetime import datetime
 from uuid import uuid4
 
 from core import db
 
-
-def _json_dumps(value: object) -> str:
-    return json.dumps(value, ensure_ascii=True)
+# jsonb parameters are plain Python values (see the codec in core.db).
+def _metadata_arg(metadata: dict | None) -> dict:
+    return metadata or {}
 
 
 async def get_conversation_by_key(conversation_key: str, *, user_id: int) -> dict | None:
@@ -46,30 +46,60 @@ async def get_or_create_conversation(conversation_key: str | None, *, user_id: i
     return row
 
 
-async def insert_message(
+_INSERT_MESSAGE_PAIR_TEMPLATE = """
+        WITH ins AS (
+          INSERT INTO messages (conversation_id, role, content, sources, metadata)
+          VALUES
+            ($1, 'user', $2, '[]'::jsonb, $4::jsonb),
+            ($1, 'assistant', $3, {assistant_sources}, $4::jsonb)
+          RETURNING id, conversation_id, role, content, sources, metadata, created_at
+        ),
+        touched AS (
+          UPDATE conversations
+          SET updated_at = now()
+          WHERE id = $1
+        )
+        SELECT id, conversation_id, role, content, sources, metadata, created_at
+        FROM ins
+        ORDER BY id
+"""
+# Turns without sources (casual chat, no-context fallback) inline the empty
+# array instead of binding and parsing a parameter.
+_INSERT_MESSAGE_PAIR_SQL = db.hot_query(_INSERT_MESSAGE_PAIR_TEMPLATE.format(assistant_sources="$5::jsonb"))
+_INSERT_MESSAGE_PAIR_NO_SOURCES_SQL = db.hot_query(
+    _INSERT_MESSAGE_PAIR_TEMPLATE.format(assistant_sources="'[]'::jsonb")
+)
+
+
+async def insert_message_pair(
     conversation_id: int,
     *,
-    role: str,
-    content: str,
+    user_content: str,
+    assistant_content: str,
     sources: list[dict] | None = None,
     metadata: dict | None = None,
-) -> dict:
-    row = await db.fetch_one(
-        """
-        INSERT INTO messages (conversation_id, role, content, sources, metadata)
-        VALUES ($1, $2, $3, $4::jsonb, $5::jsonb)
-        RETURNING id, conversation_id, role, content, sources, metadata, created_at
-        """,
+) -> list[dict]:
+    """
+    Store one user/assistant turn and bump the conversation in a single statement.
+    `sources` is attached to the assistant message; `metadata` to both.
+    """
+    metadata_arg = _metadata_arg(metadata)
+    if not sources:
+        return await db.fetch_all(
+            _INSERT_MESSAGE_PAIR_NO_SOURCES_SQL,
+            conversation_id,
+            user_content,
+            assistant_content,
+            metadata_arg,
+        )
+    return await db.fetch_all(
+        _INSERT_MESSAGE_PAIR_SQL,
         conversation_id,
-        role,
-        content,
-        _json_dumps(sources or []),
-        _json_dumps(metadata or {}),
+        user_content,
+        assistant_content,
+        metadata_arg,
+        sources,
     )
-    await db.execute("UPDATE conversations SET updated_at = now() WHERE id = $1", conversation_id)
-    if row is None:
-        raise RuntimeError("Failed to insert message.")
-    return row
 
 
 async def list_recent_messages(conversation_id: int, *, limit: int = 8) -> list[dict]:
@@ -88,25 +118,145 @@ async def list_recent_messages(conversation_id: int, *, limit: int = 8) -> list[
     return rows
 
 
-async def list_messages_by_key(conversation_key: str, *, user_id: int, limit: int = 50) -> list[dict]:
-    return await db.fetch_all(
+async def list_messages_by_key(
+    conversation_key: str,
+    *,
+    user_id: int,
+    limit: int = 50,
+) -> tuple[bool, list[dict]]:
+    """
+    Returns (conversation_exists, messages) with messages oldest first.
+    A conversation with no messages yields a single all-NULL message row,
+    which is dropped here.
+    """
+    rows = await db.fetch_all(
         """
-        SELECT x.id, x.conversation_id, x.role, x.content, x.sources, x.metadata, x.created_at
-        FROM (
+        SELECT m.id, m.conversation_id, m.role, m.content, m.sources, m.metadata, m.created_at
+        FROM conversations c
+        LEFT JOIN LATERAL (
           SELECT m.id, m.conversation_id, m.role, m.content, m.sources, m.metadata, m.created_at
           FROM messages m
-          JOIN conversations c ON c.id = m.conversation_id
-          WHERE c.conversation_key = $1
-            AND c.user_id = $2
+          WHERE m.conversation_id = c.id
           ORDER BY m.created_at DESC, m.id DESC
           LIMIT $3
-        ) x
-        ORDER BY x.created_at ASC, x.id ASC
+        ) m ON true
+        WHERE c.conversation_key = $1
+          AND c.user_id = $2
+        ORDER BY m.created_at DESC, m.id DESC
         """,
         conversation_key,
         user_id,
         limit,
     )
+    if not rows:
+        return False, []
+    messages = [row for row in rows if row["id"] is not None]
+    messages.reverse()
+    return True, messages
+
+
+# list_conversations: `page` picks the conversation rows; the shared tail adds
+# message counts and previews for those rows only.
+_CONVERSATION_PAGE_TAIL = """
+        latest AS (
+          SELECT DISTINCT ON (m.conversation_id)
+            m.conversation_id,
+            left(m.content, 180) AS last_message_preview
+          FROM messages m
+          WHERE m.conversation_id IN (SELECT id FROM page)
+          ORDER BY m.conversation_id, m.created_at DESC, m.id DESC
+        ),
+        counts AS (
+          SELECT m.conversation_id, count(*)::int AS message_count
+          FROM messages m
+          WHERE m.conversation_id IN (SELECT id FROM page)
+          GROUP BY m.conversation_id
+        )
+        SELECT
+          p.id AS row_id,
+          p.conversation_key AS conversation_id,
+          p.created_at,
+          p.updated_at,
+          COALESCE(counts.message_count, 0)::int AS message_count,
+          latest.last_message_preview,
+          p.best_similarity
+        FROM page p
+        LEFT JOIN latest ON latest.conversation_id = p.id
+        LEFT JOIN counts ON counts.conversation_id = p.id
+"""
+
+_LIST_CONVERSATIONS_SQL = db.hot_query(
+    """
+        WITH page AS (
+          SELECT c.id, c.conversation_key, c.created_at, c.updated_at, 0.0::float8 AS best_similarity
+          FROM conversations c
+          WHERE c.user_id = $1
+          ORDER BY c.updated_at DESC, c.id DESC
+          LIMIT $2
+          OFFSET $3
+        ),
+"""
+    + _CONVERSATION_PAGE_TAIL
+    + """
+        ORDER BY p.updated_at DESC, p.id DESC
+"""
+)
+
+_LIST_CONVERSATIONS_AFTER_CURSOR_SQL = db.hot_query(
+    """
+        WITH page AS (
+          SELECT c.id, c.conversation_key, c.created_at, c.updated_at, 0.0::float8 AS best_similarity
+          FROM conversations c
+          WHERE c.user_id = $1
+            AND (c.updated_at, c.id) < ($3::timestamptz, $4::bigint)
+          ORDER BY c.updated_at DESC, c.id DESC
+          LIMIT $2
+        ),
+"""
+    + _CONVERSATION_PAGE_TAIL
+    + """
+        ORDER BY p.updated_at DESC, p.id DESC
+"""
+)
+
+_SEARCH_CONVERSATIONS_SQL = db.hot_query(
+    """
+        WITH matched AS (
+          -- similarity() runs once per candidate message, in the subquery;
+          -- the outer query only aggregates the computed column.
+          SELECT hits.conversation_id, max(hits.sim) AS best_similarity
+          FROM (
+            SELECT m.conversation_id, similarity(lower(m.content), $4) AS sim
+            FROM messages m
+            JOIN conversations c2 ON c2.id = m.conversation_id
+            WHERE c2.user_id = $1
+              AND (
+                lower(m.content) % $4
+                OR lower(m.content) LIKE ('%' || $4 || '%')
+              )
+          ) hits
+          GROUP BY hits.conversation_id
+        ),
+        page AS (
+          SELECT
+            c.id,
+            c.conversation_key,
+            c.created_at,
+            c.updated_at,
+            matched.best_similarity::float8 AS best_similarity
+          FROM conversations c
+          JOIN matched ON matched.conversation_id = c.id
+          WHERE c.user_id = $1
+          ORDER BY matched.best_similarity DESC, c.updated_at DESC, c.id DESC
+          LIMIT $2
+          OFFSET $3
+        ),
+"""
+    + _CONVERSATION_PAGE_TAIL
+    + """
+        ORDER BY p.best_similarity DESC, p.updated_at DESC, p.id DESC
+"""
+)
 
 
 async def list_conversations(
@@ -116,64 +266,30 @@ async def list_conversations(
     offset: int = 0,
     search_query: str = "",
     similarity_threshold: float = 0.2,
+    cursor: tuple[datetime, int] | None = None,
 ) -> list[dict]:
     """
     List conversations for a user, newest first.
-    Includes message count and a short preview from the latest message.
-    If search_query is set, applies fuzzy matching over all message content.
+    Includes message count and a short preview from the latest message; both
+    are computed only for the conversations on the requested page.
+    If search_query is set, applies fuzzy matching over all message content
+    (ordered by best similarity; cursor is ignored).
+    If cursor (updated_at, id) is set, returns rows strictly after it in
+    (updated_at DESC, id DESC) order; rows carry `row_id` for the next cursor.
     """
     q = (search_query or "").strip().lower()
-    return await db.fetch_all(
-        """
-        WITH matched AS (
-          SELECT
-            m.conversation_id,
-            max(similarity(lower(m.content), $4)) AS best_similarity
-          FROM messages m
-          JOIN conversations c2 ON c2.id = m.conversation_id
-          WHERE c2.user_id = $1
-            AND $4 <> ''
-            AND (
-              lower(m.content) % $4
-              OR similarity(lower(m.content), $4) >= $5
-              OR lower(m.content) LIKE ('%' || $4 || '%')
-            )
-          GROUP BY m.conversation_id
+    if not q:
+        if cursor is not None:
+            return await db.fetch_all(_LIST_CONVERSATIONS_AFTER_CURSOR_SQL, user_id, limit, *cursor)
+        return await db.fetch_all(_LIST_CONVERSATIONS_SQL, user_id, limit, offset)
+
+    # Both `%` and LIKE '%..%' can use messages_content_trgm_idx; a bare
+    # `similarity(...) >= $n` predicate cannot, so the threshold is applied
+    # through pg_trgm.similarity_threshold for this transaction instead.
+    async with db.transaction() as conn:
+        await conn.execute(
+            "SELECT set_config('pg_trgm.similarity_threshold', $1, true)",
+            str(similarity_threshold),
         )
-        SELECT
-          c.conversation_key AS conversation_id,
-          c.created_at,
-          c.updated_at,
-          COALESCE(msg.message_count, 0)::int AS message_count,
-          msg.last_message_preview,
-          COALESCE(matched.best_similarity, 0.0)::float8 AS best_similarity
-        FROM conversations c
-        LEFT JOIN LATERAL (
-          SELECT
-            count(*)::int AS message_count,
-            (
-              SELECT left(m2.content, 180)
-              FROM messages m2
-              WHERE m2.conversation_id = c.id
-              ORDER BY m2.created_at DESC, m2.id DESC
-              LIMIT 1
-            ) AS last_message_preview
-          FROM messages m
-          WHERE m.conversation_id = c.id
-        ) msg ON true
-        LEFT JOIN matched ON matched.conversation_id = c.id
-        WHERE c.user_id = $1
-          AND ($4 = '' OR matched.conversation_id IS NOT NULL)
-        ORDER BY
-          CASE WHEN $4 <> '' THEN COALESCE(matched.best_similarity, 0.0) END DESC,
-          c.updated_at DESC,
-          c.id DESC
-        LIMIT $2
-        OFFSET $3
-        """,
-        user_id,
-        limit,
-        offset,
-        q,
-        similarity_threshold,
-    )
+        rows = await conn.fetch(_SEARCH_CONVERSATIONS_SQL, user_id, limit, offset, q)
+    return db.records_to_dicts(rows)
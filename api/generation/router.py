@@ -5,9 +5,11 @@ Generation API endpoints.
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from auth import dependencies as auth_dependencies
+from core.sse import sse_response
 from . import service
 
 router = APIRouter()
@@ -44,10 +46,34 @@ async def chat(
     )
 
 
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    current_user: dict = Depends(auth_dependencies.get_current_user),
+) -> StreamingResponse:
+    """
+    Same as POST /chat, but streams the answer as server-sent events
+    (`delta` events, then a final `done` or `error` event).
+    """
+    turn = await service.prepare_chat_turn(
+        request.question,
+        user_id=int(current_user["id"]),
+        top_k=request.top_k,
+        full_text_candidate_limit=request.full_text_candidate_limit,
+        vector_candidate_limit=request.vector_candidate_limit,
+        full_text_weight=request.full_text_weight,
+        vector_weight=request.vector_weight,
+        rrf_rank_constant=request.rrf_rank_constant,
+        conversation_id=request.conversation_id,
+    )
+    return sse_response(service.stream_chat_turn(turn, debug=request.debug))
+
+
 @router.get("/conversations")
 async def list_conversations(
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(default=None, max_length=200),
     q: str = Query(default="", max_length=500),
     similarity_threshold: float = Query(default=0.2, ge=0.0, le=1.0),
     current_user: dict = Depends(auth_dependencies.get_current_user),
@@ -56,6 +82,7 @@ async def list_conversations(
         user_id=int(current_user["id"]),
         limit=limit,
         offset=offset,
+        cursor=cursor,
         search_query=q,
         similarity_threshold=similarity_threshold,
     )
@@ -2,19 +2,30 @@
 Generation orchestration.
 
 Flow:
-1) Retrieve relevant chunks (hybrid search)
+1) Classify the route and retrieve relevant chunks (hybrid search), concurrently
 2) Build prompt with context + source ids
 3) Load recent conversation history
 4) Ask Ollama LLM for final answer
-5) Save messages to DB
+5) Save the user/assistant turn to DB
+
+Env settings are read once per process (restart to pick up changes).
 """
 
 from __future__ import annotations
 
-import json
+import asyncio
+import base64
+import hashlib
+import logging
 import os
+import time
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
 from typing import Any
 
+import orjson
 from fastapi import HTTPException
 
 from core import ollama
@@ -23,6 +34,13 @@ from retrieval import service as retrieval_service
 
 from . import prompts, repository
 
+logger = logging.getLogger(__name__)
+
+SELECTED_MODELS_TTL_S = 5.0
+
+# (monotonic timestamp, (generation_model, router_model)) from the last DB read.
+_selected_models_cache: tuple[float, tuple[str, str]] | None = None
+
 
 def _env_int(name: str, default: int) -> int:
     raw = os.environ.get(name, "").strip()
@@ -44,56 +62,82 @@ def _env_float(name: str, default: float) -> float:
         return default
 
 
+@lru_cache(maxsize=1)
 def ollama_base_url() -> str:
     return os.environ.get("OLLAMA_BASE_URL", "http://ollama:11434").strip() or "http://ollama:11434"
 
 
+@lru_cache(maxsize=1)
 def generation_model_env_default() -> str:
     return os.environ.get("GENERATION_MODEL", "qwen2.5:3b-instruct").strip() or "qwen2.5:3b-instruct"
 
 
+@lru_cache(maxsize=1)
 def router_model_env_default() -> str:
     return os.environ.get("GENERATION_ROUTER_MODEL", "").strip() or generation_model_env_default()
 
 
 async def selected_models() -> tuple[str, str]:
+    """
+    Returns (generation_model, router_model), cached for a few seconds.
+    """
+    global _selected_models_cache
+    now = time.monotonic()
+    if _selected_models_cache is not None and now - _selected_models_cache[0] < SELECTED_MODELS_TTL_S:
+        return _selected_models_cache[1]
+
     row = await model_repository.get_model_settings()
     if row is None:
-        return generation_model_env_default(), router_model_env_default()
+        models = generation_model_env_default(), router_model_env_default()
+    else:
+        generation_model = str(row.get("generation_model") or "").strip() or generation_model_env_default()
+        router_model = str(row.get("router_model") or "").strip() or router_model_env_default()
+        models = generation_model, router_model
+    _selected_models_cache = (now, models)
+    return models
 
-    generation_model = str(row.get("generation_model") or "").strip() or generation_model_env_default()
-    router_model = str(row.get("router_model") or "").strip() or router_model_env_default()
-    return generation_model, router_model
 
+def invalidate_selected_models() -> None:
+    global _selected_models_cache
+    _selected_models_cache = None
 
+
+@lru_cache(maxsize=1)
 def generation_timeout_s() -> float:
     return _env_float("GENERATION_TIMEOUT_S", 120.0)
 
 
+@lru_cache(maxsize=1)
 def generation_temperature() -> float:
     return _env_float("GENERATION_TEMPERATURE", 0.2)
 
 
+@lru_cache(maxsize=1)
 def generation_top_k_default() -> int:
     return _env_int("GENERATION_TOP_K", 5)
 
 
+@lru_cache(maxsize=1)
 def generation_context_chars_per_chunk() -> int:
     return _env_int("GENERATION_CONTEXT_CHARS_PER_CHUNK", 2200)
 
 
+@lru_cache(maxsize=1)
 def history_messages_limit() -> int:
     return _env_int("GENERATION_HISTORY_MESSAGES", 8)
 
 
+@lru_cache(maxsize=1)
 def generation_max_output_tokens() -> int:
     return _env_int("GENERATION_MAX_OUTPUT_TOKENS", 200)
 
 
+@lru_cache(maxsize=1)
 def route_timeout_s() -> float:
     return _env_float("GENERATION_ROUTE_TIMEOUT_S", 20.0)
 
 
+@lru_cache(maxsize=1)
 def route_max_output_tokens() -> int:
     return _env_int("GENERATION_ROUTE_MAX_OUTPUT_TOKENS", 60)
 
@@ -103,9 +147,14 @@ def _parse_route(text: str) -> str:
     if not raw:
         return "rag"
 
+    lower = raw.lower()
+    # Short outputs such as {"route":"casual"} or plain "casual" need no JSON parse.
+    if len(raw) < 30 and "casual" in lower:
+        return "casual"
+
     # Try strict JSON first.
     try:
-        data = json.loads(raw)
+        data = orjson.loads(raw)
         route = str((data or {}).get("route") or "").strip().lower()
         if route in {"casual", "rag"}:
             return route
@@ -113,17 +162,28 @@ def _parse_route(text: str) -> str:
         pass
 
     # Try simple fallback (e.g. model returned plain text).
-    lower = raw.lower()
     if "casual" in lower:
         return "casual"
     return "rag"
 
 
-def _build_history_messages(
+def _prepare_history(
     history_rows: list[dict[str, Any]],
-) -> list[dict[str, str]]:
+    *,
+    max_items: int = 6,
+    max_chars: int = 1200,
+) -> tuple[list[dict[str, str]], str]:
+    """
+    Single pass over recent history rows.
+
+    Returns (chat messages for the LLM, compact text view for route
+    classification). The routing text covers the last `max_items` rows and
+    keeps at most the last `max_chars` characters.
+    """
     messages: list[dict[str, str]] = []
-    for row in history_rows:
+    routing_lines: list[str] = []
+    routing_start = len(history_rows) - max_items
+    for i, row in enumerate(history_rows):
         role = str(row.get("role") or "")
         if role not in {"user", "assistant"}:
             continue
@@ -131,38 +191,21 @@ def _build_history_messages(
         if not content:
             continue
         messages.append({"role": role, "content": content})
-    return messages
+        if i >= routing_start:
+            routing_lines.append(f"{role}: {content}")
 
-
-def _history_text_for_routing(history_rows: list[dict[str, Any]], *, max_items: int = 6, max_chars: int = 1200) -> str:
-    """
-    Compact text view of recent history for route classification.
-    """
-    if not history_rows:
-        return "(empty)"
-
-    selected = history_rows[-max_items:]
-    lines: list[str] = []
-    for row in selected:
-        role = str(row.get("role") or "").strip()
-        content = str(row.get("content") or "").strip()
-        if role not in {"user", "assistant"} or not content:
-            continue
-        lines.append(f"{role}: {content}")
-
-    text = "\n".join(lines).strip() or "(empty)"
-    if len(text) > max_chars:
-        return text[-max_chars:]
-    return text
+    routing_text = "\n".join(routing_lines) or "(empty)"
+    if len(routing_text) > max_chars:
+        routing_text = routing_text[-max_chars:]
+    return messages, routing_text
 
 
 async def _classify_route_with_history(
     question: str,
-    history_rows: list[dict[str, Any]],
+    history_text: str,
     *,
     route_model_name: str,
 ) -> str:
-    history_text = _history_text_for_routing(history_rows)
     try:
         text = await ollama.chat_messages(
             base_url=ollama_base_url(),
@@ -180,14 +223,32 @@ async def _classify_route_with_history(
     return _parse_route(text)
 
 
+def _discard_task_result(task: asyncio.Task) -> None:
+    # Retrieve the outcome of an abandoned task so asyncio doesn't log it as unhandled.
+    if not task.cancelled():
+        task.exception()
+
+
 # Build context from retrieved chunks (document knowledge), not chat history.
 def _build_context(results: list[dict[str, Any]]) -> tuple[str, list[dict[str, Any]]]:
+    """
+    Chunks are capped at GENERATION_CONTEXT_CHARS_PER_CHUNK and near-duplicates
+    (same leading text, e.g. the same file uploaded twice) are skipped, so they
+    don't cost prompt tokens. Source ids stay contiguous (S1, S2, ...).
+    """
+    max_chars = generation_context_chars_per_chunk()
     blocks: list[str] = []
     sources: list[dict[str, Any]] = []
+    seen: set[bytes] = set()
+
+    for row in results:
+        text = str(row.get("text") or "")[:max_chars].strip()
+        fingerprint = hashlib.blake2b(" ".join(text[:400].split())[:200].encode("utf-8"), digest_size=8).digest()
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
 
-    for i, row in enumerate(results, start=1):
-        source_id = f"S{i}"
-        text = str(row.get("text") or "").strip()
+        source_id = f"S{len(sources) + 1}"
         filename = str(row.get("filename") or "unknown")
         chunk_index = int(row.get("chunk_index") or 0)
 
@@ -212,7 +273,29 @@ def _build_context(results: list[dict[str, Any]]) -> tuple[str, list[dict[str, A
     return "\n\n".join(blocks), sources
 
 
-async def chat(
+NO_CONTEXT_ANSWER = "I could not find relevant context for this question."
+
+
+@dataclass(frozen=True)
+class ChatTurn:
+    """
+    Everything needed to generate and store one answer.
+
+    `ollama_messages` is None when no LLM call is needed (no retrieval hits);
+    the answer is then `NO_CONTEXT_ANSWER`.
+    """
+
+    conversation_key: str
+    conversation_db_id: int
+    question: str
+    route: str
+    generation_model: str
+    ollama_messages: list[dict[str, str]] | None
+    sources: list[dict[str, Any]]
+    retrieval_results: list[dict[str, Any]]
+
+
+async def prepare_chat_turn(
     question: str,
     *,
     user_id: int,
@@ -222,9 +305,12 @@ async def chat(
     full_text_weight: float = 0.5,
     vector_weight: float = 0.5,
     rrf_rank_constant: int = 60,
-    debug: bool = False,
     conversation_id: str | None = None,
-) -> dict[str, Any]:
+) -> ChatTurn:
+    """
+    Resolve the conversation, route the question, retrieve context and build the prompt.
+    Raises HTTPException for invalid input, before anything is generated.
+    """
     question = (question or "").strip()
     if not question:
         raise HTTPException(status_code=400, detail="Question is empty.")
@@ -240,122 +326,207 @@ async def chat(
         internal_conversation_id,
         limit=max(0, min(history_messages_limit(), 50)),
     )
+    history_messages, routing_history_text = _prepare_history(recent_messages)
     selected_generation_model, selected_route_model = await selected_models()
-    route = await _classify_route_with_history(
-        question,
-        recent_messages,
-        route_model_name=selected_route_model,
+
+    # Routing and retrieval are independent, so run them concurrently and
+    # drop the retrieval results if the question turns out to be casual.
+    limit = top_k if top_k is not None else generation_top_k_default()
+    limit = max(1, min(limit, 20))
+    route_task = asyncio.create_task(
+        _classify_route_with_history(
+            question,
+            routing_history_text,
+            route_model_name=selected_route_model,
+        )
+    )
+    retrieval_task = asyncio.create_task(
+        retrieval_service.search_hybrid(
+            question,
+            user_id=user_id,
+            limit=limit,
+            text_chars=generation_context_chars_per_chunk(),
+            full_text_candidate_limit=full_text_candidate_limit,
+            vector_candidate_limit=vector_candidate_limit,
+            full_text_weight=full_text_weight,
+            vector_weight=vector_weight,
+            rrf_rank_constant=rrf_rank_constant,
+        )
     )
-    history_messages = _build_history_messages(recent_messages)
+    try:
+        route = await route_task
+    except BaseException:
+        route_task.cancel()
+        retrieval_task.cancel()
+        retrieval_task.add_done_callback(_discard_task_result)
+        raise
 
     if route == "casual":
+        retrieval_task.cancel()
+        retrieval_task.add_done_callback(_discard_task_result)
         ollama_messages: list[dict[str, str]] = [{"role": "system", "content": prompts.casual_system_prompt()}]
         ollama_messages.extend(history_messages)
         ollama_messages.append({"role": "user", "content": question})
-
-        await repository.insert_message(
-            internal_conversation_id,
-            role="user",
-            content=question,
-            metadata={"route": route},
-        )
-        answer = await ollama.chat_messages(
-            base_url=ollama_base_url(),
-            model=selected_generation_model,
-            messages=ollama_messages,
-            timeout_s=generation_timeout_s(),
-            temperature=generation_temperature(),
-            max_output_tokens=generation_max_output_tokens(),
+        return ChatTurn(
+            conversation_key=conversation_key,
+            conversation_db_id=internal_conversation_id,
+            question=question,
+            route=route,
+            generation_model=selected_generation_model,
+            ollama_messages=ollama_messages,
+            sources=[],
+            retrieval_results=[],
         )
-        await repository.insert_message(
-            internal_conversation_id,
-            role="assistant",
-            content=answer,
-            metadata={"route": route},
+
+    retrieval_results = await retrieval_task
+    if not retrieval_results:
+        return ChatTurn(
+            conversation_key=conversation_key,
+            conversation_db_id=internal_conversation_id,
+            question=question,
+            route=route,
+            generation_model=selected_generation_model,
+            ollama_messages=None,
+            sources=[],
+            retrieval_results=[],
         )
 
-        result: dict[str, Any] = {
-            "conversation_id": conversation_key,
-            "question": question,
-            "answer": answer,
-            "sources": [],
-        }
-        if debug:
-            result["route"] = route
-        return result
+    context_block, sources = _build_context(retrieval_results)
+    ollama_messages = [{"role": "system", "content": prompts.system_prompt()}]
+    ollama_messages.extend(history_messages)
+    ollama_messages.append({"role": "user", "content": prompts.user_prompt(question, context_block)})
+    return ChatTurn(
+        conversation_key=conversation_key,
+        conversation_db_id=internal_conversation_id,
+        question=question,
+        route=route,
+        generation_model=selected_generation_model,
+        ollama_messages=ollama_messages,
+        sources=sources,
+        retrieval_results=retrieval_results,
+    )
 
-    limit = top_k if top_k is not None else generation_top_k_default()
-    limit = max(1, min(limit, 20))
-    retrieval_results = await retrieval_service.search_hybrid(
+
+async def _save_turn(turn: ChatTurn, answer: str) -> None:
+    await repository.insert_message_pair(
+        turn.conversation_db_id,
+        user_content=turn.question,
+        assistant_content=answer,
+        sources=turn.sources,
+        metadata={"route": turn.route},
+    )
+
+
+def _turn_result(turn: ChatTurn, *, debug: bool) -> dict[str, Any]:
+    result: dict[str, Any] = {
+        "conversation_id": turn.conversation_key,
+        "question": turn.question,
+        "sources": turn.sources,
+    }
+    if debug and turn.ollama_messages is not None:
+        result["route"] = turn.route
+        if turn.route != "casual":
+            result["retrieval"] = turn.retrieval_results
+    return result
+
+
+async def chat(
+    question: str,
+    *,
+    user_id: int,
+    top_k: int | None = None,
+    full_text_candidate_limit: int = 50,
+    vector_candidate_limit: int = 50,
+    full_text_weight: float = 0.5,
+    vector_weight: float = 0.5,
+    rrf_rank_constant: int = 60,
+    debug: bool = False,
+    conversation_id: str | None = None,
+) -> dict[str, Any]:
+    turn = await prepare_chat_turn(
         question,
         user_id=user_id,
-        limit=limit,
-        text_chars=generation_context_chars_per_chunk(),
+        top_k=top_k,
         full_text_candidate_limit=full_text_candidate_limit,
         vector_candidate_limit=vector_candidate_limit,
         full_text_weight=full_text_weight,
         vector_weight=vector_weight,
         rrf_rank_constant=rrf_rank_constant,
+        conversation_id=conversation_id,
     )
-
-    if not retrieval_results:
-        fallback_answer = "I could not find relevant context for this question."
-        await repository.insert_message(
-            internal_conversation_id,
-            role="user",
-            content=question,
-            metadata={"route": route},
-        )
-        await repository.insert_message(
-            internal_conversation_id,
-            role="assistant",
-            content=fallback_answer,
-            metadata={"route": route},
+    if turn.ollama_messages is None:
+        answer = NO_CONTEXT_ANSWER
+    else:
+        answer = await ollama.chat_messages(
+            base_url=ollama_base_url(),
+            model=turn.generation_model,
+            messages=turn.ollama_messages,
+            timeout_s=generation_timeout_s(),
+            temperature=generation_temperature(),
+            max_output_tokens=generation_max_output_tokens(),
         )
-        return {
-            "conversation_id": conversation_key,
-            "question": question,
-            "answer": fallback_answer,
-            "sources": [],
-        }
+    await _save_turn(turn, answer)
 
-    context_block, sources = _build_context(retrieval_results)
-    ollama_messages: list[dict[str, str]] = [{"role": "system", "content": prompts.system_prompt()}]
-    ollama_messages.extend(history_messages)
-    ollama_messages.append({"role": "user", "content": prompts.user_prompt(question, context_block)})
+    result = _turn_result(turn, debug=debug)
+    result["answer"] = answer
+    return result
 
-    await repository.insert_message(
-        internal_conversation_id,
-        role="user",
-        content=question,
-        metadata={"route": route},
-    )
-    answer = await ollama.chat_messages(
-        base_url=ollama_base_url(),
-        model=selected_generation_model,
-        messages=ollama_messages,
-        timeout_s=generation_timeout_s(),
-        temperature=generation_temperature(),
-        max_output_tokens=generation_max_output_tokens(),
-    )
-    await repository.insert_message(
-        internal_conversation_id,
-        role="assistant",
-        content=answer,
-        sources=sources,
-        metadata={"route": route},
-    )
 
-    result: dict[str, Any] = {
-        "conversation_id": conversation_key,
-        "question": question,
-        "answer": answer,
-        "sources": sources,
-    }
-    if debug:
-        result["route"] = route
-        result["retrieval"] = retrieval_results
-    return result
+async def stream_chat_turn(turn: ChatTurn, *, debug: bool = False) -> AsyncIterator[tuple[str, dict[str, Any]]]:
+    """
+    Generate the answer for a prepared turn as (event, data) pairs:
+    - ("delta", {"delta": text}) for each piece of the answer
+    - ("done", {...}) once the turn is stored (same fields as chat(), minus the answer)
+    - ("error", {"detail": ...}) if generation or storing fails; nothing is stored then
+    """
+    if turn.ollama_messages is None:
+        yield "delta", {"delta": NO_CONTEXT_ANSWER}
+        answer = NO_CONTEXT_ANSWER
+    else:
+        timeout_s = generation_timeout_s()
+        parts: list[str] = []
+        stream = ollama.chat_stream(
+            base_url=ollama_base_url(),
+            model=turn.generation_model,
+            messages=turn.ollama_messages,
+            timeout_s=timeout_s,
+            temperature=generation_temperature(),
+            max_output_tokens=generation_max_output_tokens(),
+        )
+        # One deadline for the whole answer, like chat_messages(). It only
+        # covers waiting for Ollama; yielding happens outside it, so it never
+        # fires while the caller is writing to the client.
+        deadline = asyncio.get_running_loop().time() + timeout_s
+        try:
+            while True:
+                async with asyncio.timeout_at(deadline):
+                    delta = await anext(stream, None)
+                if delta is None:
+                    break
+                parts.append(delta)
+                yield "delta", {"delta": delta}
+        except ollama.OllamaError as exc:
+            yield "error", {"detail": str(exc) or type(exc).__name__}
+            return
+        except TimeoutError:
+            yield "error", {"detail": f"Ollama chat did not finish within {timeout_s:g}s."}
+            return
+        finally:
+            await stream.aclose()
+
+        answer = "".join(parts).strip()
+        if not answer:
+            yield "error", {"detail": "Ollama returned an empty chat response."}
+            return
+
+    try:
+        await _save_turn(turn, answer)
+    except Exception:
+        # The response has already started; report instead of cutting the stream.
+        logger.exception("chat_turn_save_failed conversation_id=%s", turn.conversation_key)
+        yield "error", {"detail": "Failed to save the conversation."}
+        return
+    yield "done", _turn_result(turn, debug=debug)
 
 
 async def get_conversation_messages(conversation_id: str, *, user_id: int, limit: int = 50) -> dict[str, Any]:
@@ -363,37 +534,71 @@ async def get_conversation_messages(conversation_id: str, *, user_id: int, limit
     if not conversation_id:
         raise HTTPException(status_code=400, detail="conversation_id is empty.")
 
-    conversation = await repository.get_conversation_by_key(conversation_id, user_id=user_id)
-    if conversation is None:
-        raise HTTPException(status_code=404, detail="Conversation not found.")
-
-    rows = await repository.list_messages_by_key(
+    exists, rows = await repository.list_messages_by_key(
         conversation_id,
         user_id=user_id,
         limit=max(1, min(limit, 200)),
     )
+    if not exists:
+        raise HTTPException(status_code=404, detail="Conversation not found.")
     return {"conversation_id": conversation_id, "messages": rows}
 
 
+def _encode_conversation_cursor(updated_at: datetime, row_id: int) -> str:
+    raw = f"{updated_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_conversation_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        updated_at, row_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|", 1)
+        parsed = datetime.fromisoformat(updated_at)
+        if parsed.tzinfo is None:
+            raise ValueError("cursor timestamp must be timezone-aware")
+        return parsed, int(row_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor.") from exc
+
+
 async def list_conversations(
     *,
     user_id: int,
     limit: int = 50,
     offset: int = 0,
+    cursor: str | None = None,
     search_query: str = "",
     similarity_threshold: float = 0.2,
 ) -> dict[str, Any]:
+    searching = bool((search_query or "").strip())
+    keyset = None
+    if cursor:
+        if searching:
+            raise HTTPException(status_code=400, detail="cursor cannot be combined with q.")
+        keyset = _decode_conversation_cursor(cursor)
+        offset = 0
+
+    page_size = max(1, min(limit, 200))
     rows = await repository.list_conversations(
         user_id=user_id,
-        limit=max(1, min(limit, 200)),
+        limit=page_size,
         offset=max(0, offset),
         search_query=search_query,
         similarity_threshold=max(0.0, min(similarity_threshold, 1.0)),
+        cursor=keyset,
     )
+    next_cursor = None
+    if rows and not searching and len(rows) == page_size:
+        last = rows[-1]
+        next_cursor = _encode_conversation_cursor(last["updated_at"], last["row_id"])
+    for row in rows:
+        row.pop("row_id", None)
+
     return {
         "conversations": rows,
         "limit": limit,
         "offset": offset,
+        "next_cursor": next_cursor,
         "search_query": search_query,
         "similarity_threshold": similarity_threshold,
         "count": len(rows),
@@ -12,6 +12,8 @@ Default behavior:
 from __future__ import annotations
 
 import os
+import re
+from collections.abc import Iterable, Iterator
 from functools import lru_cache
 from typing import Any
 
@@ -20,6 +22,9 @@ DEFAULT_CHUNK_SIZE_CHARS = 1000
 DEFAULT_CHUNK_OVERLAP_CHARS = 100
 DEFAULT_MIN_CHUNK_CHARS = 350
 
+# Lightweight sentence boundary: whitespace after terminal punctuation.
+_SENT_SPLIT_RE = re.compile(r"(?<=[.!?\u2026])\s+")
+
 
 def _env_int(name: str, default: int) -> int:
     raw = os.environ.get(name, "").strip()
@@ -40,7 +45,8 @@ def chunk_settings() -> tuple[int, int, int, str, bool]:
     - CHUNK_OVERLAP_CHARS: overlap between chunks in characters
     - CHUNK_MIN_CHARS: final chunk smaller than this gets merged into the previous
     - CHUNK_LANGUAGE: spaCy blank pipeline language (default: xx)
-    - CHUNK_USE_SPACY: "1" to prefer spaCy sentence segmentation when available
+    - CHUNK_USE_SPACY: "1" to prefer spaCy sentence segmentation when available;
+      otherwise sentences are split with a regex (no spaCy import)
     """
     chunk_size = _env_int("CHUNK_SIZE_CHARS", DEFAULT_CHUNK_SIZE_CHARS)
     overlap = _env_int("CHUNK_OVERLAP_CHARS", DEFAULT_CHUNK_OVERLAP_CHARS)
@@ -118,47 +124,46 @@ def _chunk_text_internal(
     if not text:
         return [], "empty", {}
 
+    overlap_chars = _effective_overlap(chunk_size_chars, overlap_chars)
+    extra: dict[str, Any] = {}
+
+    # Prefer spaCy sentence segmentation when available; otherwise use the regex splitter.
+    spacy_ok = use_spacy and _spacy_available()
+    sentences = _iter_spacy_sentences(text, language) if spacy_ok else _iter_sentences(text)
+    chunks, had_long_sentence_fallback = _chunk_sentence_aware(
+        sentences,
+        chunk_size_chars=chunk_size_chars,
+        overlap_chars=overlap_chars,
+    )
+    strategy = "spacy_sentencizer" if spacy_ok else "regex_sentences"
+    extra["spacy_available"] = spacy_ok
+    extra["had_long_sentence_fallback"] = had_long_sentence_fallback
+
+    chunks, extra["merged_final_small_chunk"] = _finalize_chunks(chunks, min_chunk_chars=min_chunk_chars)
+    return chunks, strategy, extra
+
+
+def _effective_overlap(chunk_size_chars: int, overlap_chars: int) -> int:
     if chunk_size_chars <= 0:
         raise ValueError("chunk_size_chars must be > 0")
     if overlap_chars < 0:
         raise ValueError("overlap_chars must be >= 0")
     if overlap_chars >= chunk_size_chars:
         # Overlap can't be >= chunk size, otherwise the window doesn't progress.
-        overlap_chars = max(0, chunk_size_chars // 10)
-
-    extra: dict[str, Any] = {}
+        return max(0, chunk_size_chars // 10)
+    return overlap_chars
 
-    # Prefer sentence-aware chunking when available.
-    if use_spacy and _spacy_available():
-        chunks, had_long_sentence_fallback = _chunk_sentence_aware(
-            text,
-            chunk_size_chars=chunk_size_chars,
-            overlap_chars=overlap_chars,
-            language=language,
-        )
-        strategy = "spacy_sentencizer"
-        extra["spacy_available"] = True
-        extra["had_long_sentence_fallback"] = had_long_sentence_fallback
-    else:
-        chunks = _chunk_simple(
-            text,
-            chunk_size_chars=chunk_size_chars,
-            overlap_chars=overlap_chars,
-        )
-        strategy = "simple_chars"
-        extra["spacy_available"] = _spacy_available()
 
+def _finalize_chunks(chunks: list[str], *, min_chunk_chars: int) -> tuple[list[str], bool]:
+    """
+    Drop blank chunks and merge a small leftover final chunk into the previous one.
+    """
     chunks = [c.strip() for c in chunks if c.strip()]
-
-    # Merge a small leftover final chunk.
     if len(chunks) >= 2 and len(chunks[-1]) < min_chunk_chars:
         chunks[-2] = (chunks[-2].rstrip() + "\n\n" + chunks[-1].lstrip()).strip()
         chunks.pop()
-        extra["merged_final_small_chunk"] = True
-    else:
-        extra["merged_final_small_chunk"] = False
-
-    return chunks, strategy, extra
+        return chunks, True
+    return chunks, False
 
 
 def _chunk_simple(text: str, *, chunk_size_chars: int, overlap_chars: int) -> list[str]:
@@ -166,12 +171,7 @@ def _chunk_simple(text: str, *, chunk_size_chars: int, overlap_chars: int) -> li
     Pure character windowing: [0:chunk], then advance by (chunk - overlap).
     """
     step = max(1, chunk_size_chars - overlap_chars)
-    out: list[str] = []
-    i = 0
-    while i < len(text):
-        out.append(text[i : i + chunk_size_chars])
-        i += step
-    return out
+    return [text[i : i + chunk_size_chars] for i in range(0, len(text), step)]
 
 
 def _spacy_available() -> bool:
@@ -195,58 +195,72 @@ def _get_spacy_nlp(language: str):
     return nlp
 
 
+def _iter_spacy_sentences(text: str, language: str) -> Iterator[str]:
+    nlp = _get_spacy_nlp(language)
+    for sent in nlp(text).sents:
+        yield sent.text
+
+
+def _iter_sentences(text: str) -> Iterator[str]:
+    """
+    Regex sentence splitter used when spaCy is disabled or not installed.
+    """
+    for s in _SENT_SPLIT_RE.split(text):
+        s = s.strip()
+        if s:
+            yield s
+
+
 def _chunk_sentence_aware(
-    text: str,
+    sentences: Iterable[str],
     *,
     chunk_size_chars: int,
     overlap_chars: int,
-    language: str,
 ) -> tuple[list[str], bool]:
     """
     Pack sentences into chunks until we hit ~chunk_size_chars.
 
     Overlap is applied as the last N characters of the previous chunk.
     """
-    nlp = _get_spacy_nlp(language)
-    doc = nlp(text)
-
     chunks: list[str] = []
-    current = ""
+    # Sentences of the chunk being built; joined with single spaces on flush.
+    current: list[str] = []
+    current_len = 0
     had_long_sentence_fallback = False
 
     def flush() -> str:
-        nonlocal current
-        chunk = current.strip()
-        current = ""
+        nonlocal current_len
+        chunk = " ".join(current).strip()
+        current.clear()
+        current_len = 0
         return chunk
 
-    for sent in doc.sents:
-        s = sent.text.strip()
+    for sent in sentences:
+        s = sent.strip()
         if not s:
             continue
 
         # If a single sentence is longer than the chunk size, fall back to simple splitting.
         if len(s) > chunk_size_chars:
             had_long_sentence_fallback = True
-            if current.strip():
+            if current:
                 chunks.append(flush())
             chunks.extend(_chunk_simple(s, chunk_size_chars=chunk_size_chars, overlap_chars=overlap_chars))
             continue
 
-        if not current:
-            current = s
-            continue
-
-        if len(current) + 1 + len(s) > chunk_size_chars:
+        if current and current_len + 1 + len(s) > chunk_size_chars:
             chunk = flush()
             if chunk:
                 chunks.append(chunk)
                 if overlap_chars:
-                    current = chunk[-overlap_chars:].strip()
-            # Start (or continue) the new chunk with this sentence.
-            current = (current + " " + s).strip() if current else s
-        else:
-            current = (current + " " + s).strip()
+                    seed = chunk[-overlap_chars:].strip()
+                    if seed:
+                        current.append(seed)
+                        current_len = len(seed)
+
+        # Start (or continue) the current chunk with this sentence.
+        current_len += len(s) + 1 if current else len(s)
+        current.append(s)
 
     last = flush()
     if last:
@@ -6,10 +6,13 @@ Embeddings are generated via Ollama and stored in `chunks.embedding`.
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import logging
 import os
 from dataclasses import dataclass
 
+import httpx
 from fastapi import HTTPException
 
 from core import ollama
@@ -19,6 +22,12 @@ from . import repository
 
 DEFAULT_EMBEDDING_MODEL = "nomic-embed-text"
 DEFAULT_BATCH_SIZE = 16
+DEFAULT_MIN_BATCH_SIZE = 1
+DEFAULT_MAX_BATCH_SIZE = 64
+# Consecutive successful batches before the batch size is doubled again.
+BATCH_GROW_AFTER = 3
+DEFAULT_CONCURRENCY = 8
+DEFAULT_CLAIM_LEASE_S = 300
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +50,29 @@ def ollama_base_url() -> str:
     return os.environ.get("OLLAMA_BASE_URL", "http://ollama:11434").strip() or "http://ollama:11434"
 
 
+def embedding_concurrency() -> int:
+    """
+    EMBEDDING_CONCURRENCY: parallel per-chunk requests when Ollama lacks /api/embed.
+    """
+    return max(1, _env_int("EMBEDDING_CONCURRENCY", DEFAULT_CONCURRENCY))
+
+
+def batch_size_bounds() -> tuple[int, int]:
+    """
+    Returns (min, max) batch size from EMBEDDING_BATCH_SIZE_MIN / EMBEDDING_BATCH_SIZE_MAX.
+    """
+    lo = max(1, _env_int("EMBEDDING_BATCH_SIZE_MIN", DEFAULT_MIN_BATCH_SIZE))
+    hi = max(lo, _env_int("EMBEDDING_BATCH_SIZE_MAX", DEFAULT_MAX_BATCH_SIZE))
+    return lo, hi
+
+
+def claim_lease_s() -> int:
+    """
+    EMBEDDING_CLAIM_LEASE_S: seconds before a claimed-but-unfinished chunk can be retried.
+    """
+    return max(1, _env_int("EMBEDDING_CLAIM_LEASE_S", DEFAULT_CLAIM_LEASE_S))
+
+
 def expected_dim() -> int:
     """
     DB column is vector(768).
@@ -48,6 +80,13 @@ def expected_dim() -> int:
     return 768
 
 
+def content_hash(model: str, text: str) -> bytes:
+    """
+    embedding_cache key: sha256(model || NUL || text).
+    """
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+
 @dataclass(frozen=True)
 class EmbedStats:
     document_id: int
@@ -56,45 +95,147 @@ class EmbedStats:
     remaining: int
 
 
+async def _embed_batch(
+    batch: list,
+    *,
+    model: str,
+    base_url: str,
+) -> tuple[list[tuple[int, list[float]]], dict[bytes, list[float]]]:
+    """
+    Embed one claimed batch. Returns (updates, new_cache_entries).
+    """
+    # Reuse vectors for text we've embedded before; only misses go to Ollama.
+    hashes = [content_hash(model, row["text"]) for row in batch]
+    cached = await repository.fetch_cached_embeddings(hashes)
+    misses = [i for i, h in enumerate(hashes) if h not in cached]
+
+    new_entries: dict[bytes, list[float]] = {}
+    if misses:
+        # One /api/embed request per batch instead of one request per chunk.
+        fresh = await ollama.embed_texts(
+            base_url=base_url,
+            model=model,
+            prompts=[batch[i]["text"] for i in misses],
+            concurrency=embedding_concurrency(),
+        )
+        # Cached vectors came from a vector(768) column; only fresh ones need checking.
+        dim = expected_dim()
+        bad = next((len(vec) for vec in fresh if len(vec) != dim), None)
+        if bad is not None:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Embedding dim mismatch: expected {dim}, got {bad}",
+            )
+        new_entries = {hashes[i]: vec for i, vec in zip(misses, fresh)}
+
+    updates = [
+        (int(row["id"]), cached[h] if h in cached else new_entries[h])
+        for row, h in zip(batch, hashes)
+    ]
+    return updates, new_entries
+
+
+async def _store_batch(
+    document_id: int,
+    updates: list[tuple[int, list[float]]],
+    new_entries: dict[bytes, list[float]],
+    *,
+    model: str,
+) -> tuple[int, int]:
+    written, remaining = await repository.update_chunk_embeddings(document_id, updates, model=model)
+    await repository.insert_cached_embeddings(list(new_entries.items()), model=model)
+    return written, remaining
+
+
 async def embed_document(document_id: int, *, user_id: int, batch_size: int | None = None) -> EmbedStats:
     """
     Generate embeddings for all chunks of a document that are missing embeddings.
+
+    Batches are pipelined: while batch N is written to Postgres, batch N+1 is
+    claimed and embedded, so DB writes overlap with Ollama compute.
+
+    The batch size adapts: it starts at EMBEDDING_BATCH_SIZE, halves when an
+    Ollama call fails or times out, and doubles again after a few successful
+    batches, within EMBEDDING_BATCH_SIZE_MIN..EMBEDDING_BATCH_SIZE_MAX.
     """
     model = embedding_model()
     base_url = ollama_base_url()
     bs = batch_size or _env_int("EMBEDDING_BATCH_SIZE", DEFAULT_BATCH_SIZE)
     if bs <= 0:
         bs = DEFAULT_BATCH_SIZE
+    min_bs, max_bs = batch_size_bounds()
+    bs = min(max(bs, min_bs), max_bs)
+    successes = 0
 
     embedded = 0
+    remaining: int | None = None
 
     if not await repository.document_belongs_to_user(document_id, user_id=user_id):
         raise HTTPException(status_code=404, detail="Document not found.")
 
-    # Loop until there is nothing left to embed for this document.
-    while True:
-        batch = await repository.fetch_chunks_needing_embedding(document_id, user_id=user_id, limit=bs)
-        if not batch:
-            break
-
-        updates: list[tuple[int, list[float]]] = []
-        for row in batch:
-            vec = await ollama.embed_text(
-                base_url=base_url,
-                model=model,
-                prompt=row["text"],
-            )
-            if len(vec) != expected_dim():
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Embedding dim mismatch: expected {expected_dim()}, got {len(vec)}",
+    # Claimed rows not yet embedded (left over after the batch size shrank).
+    backlog: list = []
+    # Every chunk id this call claimed; unwritten ones are released on failure.
+    claimed: list[int] = []
+    pending: asyncio.Task[tuple[int, int]] | None = None
+    try:
+        # Loop until there is nothing left to embed for this document.
+        while True:
+            if not backlog:
+                backlog = await repository.fetch_chunks_needing_embedding(
+                    document_id,
+                    user_id=user_id,
+                    limit=bs,
+                    lease_s=claim_lease_s(),
                 )
-            updates.append((int(row["id"]), vec))
+                if not backlog:
+                    break
+                claimed.extend(int(row["id"]) for row in backlog)
+            batch, backlog = backlog[:bs], backlog[bs:]
+
+            try:
+                updates, new_entries = await _embed_batch(batch, model=model, base_url=base_url)
+            except (ollama.OllamaError, httpx.TimeoutException, httpx.TransportError):
+                if len(batch) <= min_bs:
+                    raise
+                # Retry the same (still claimed) rows in smaller batches.
+                bs = max(min_bs, len(batch) // 2)
+                successes = 0
+                backlog = batch + backlog
+                logger.warning("embedding_batch_failed document_id=%s retry_batch_size=%s", document_id, bs)
+                continue
+
+            successes += 1
+            if successes >= BATCH_GROW_AFTER and bs < max_bs:
+                bs = min(max_bs, bs * 2)
+                successes = 0
+
+            if pending is not None:
+                written, remaining = await pending
+                embedded += written
+            pending = asyncio.create_task(_store_batch(document_id, updates, new_entries, model=model))
+
+        if pending is not None:
+            written, remaining = await pending
+            embedded += written
+            pending = None
+    except BaseException:
+        # On failure (including cancellation), let an in-flight write finish
+        # rather than orphan it, then hand back the claims that were never
+        # written so a retry can take them now instead of after the lease.
+        if pending is not None:
+            await asyncio.gather(pending, return_exceptions=True)
+        try:
+            await repository.release_chunk_claims(document_id, claimed)
+        except Exception:
+            logger.warning("embedding_claim_release_failed document_id=%s", document_id, exc_info=True)
+        raise
 
-        await repository.update_chunk_embeddings(updates, model=model)
-        embedded += len(updates)
+    if remaining is None:
+        # Nothing was written by this call (nothing claimable, e.g. another
+        # embedder holds the rows); report the document's real backlog.
+        remaining = await repository.count_remaining_chunks(document_id)
 
-    remaining = await repository.count_chunks_needing_embedding(document_id, user_id=user_id)
     return EmbedStats(document_id=document_id, model=model, embedded=embedded, remaining=remaining)
 
 
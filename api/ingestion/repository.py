@@ -5,7 +5,6 @@ This module is where ingestion-related SQL lives.
 
 from __future__ import annotations
 
-import json
 from typing import Any
 
 import asyncpg
@@ -13,58 +12,63 @@ import asyncpg
 from core import db
 
 
-def _json_arg(value: dict[str, Any] | None) -> str | None:
+_LIST_DOCUMENTS_SQL = db.hot_query(
     """
-    asyncpg does not automatically encode Python dicts for json/jsonb parameters.
-    We pass JSON as a string and cast to jsonb in SQL.
+    SELECT
+      d.id,
+      d.filename,
+      d.content_type,
+      d.size_bytes,
+      d.created_at,
+      d.chunk_count,
+      d.embedded_chunk_count,
+      count(*) OVER () AS total
+    FROM documents d
+    WHERE d.user_id = $1
+      AND d.deleted_at IS NULL
+    ORDER BY d.created_at DESC, d.id DESC
+    LIMIT $2
+    OFFSET $3
     """
-    if value is None:
-        return None
-    return json.dumps(value, ensure_ascii=True)
+)
 
 
-def _vector_literal(vec: list[float]) -> str:
-    """
-    Serialize a Python list of floats into a pgvector literal.
-
-    We pass this as text and cast it to `vector(768)` in SQL: $2::vector.
-    """
-    return "[" + ",".join(repr(float(x)) for x in vec) + "]"
-
-
-async def list_documents(*, user_id: int, limit: int = 100, offset: int = 0) -> list[dict[str, Any]]:
+async def list_documents(
+    *,
+    user_id: int,
+    limit: int = 100,
+    offset: int = 0,
+) -> tuple[list[dict[str, Any]], int]:
     """
     List active (not soft-deleted) documents for a user.
+
+    Returns (page, total). The total comes from the same query via a window
+    count; only a page past the end needs a separate count.
     """
     rows = await db.fetch_all(
-        """
-        SELECT
-          d.id,
-          d.filename,
-          d.content_type,
-          d.size_bytes,
-          d.created_at,
-          COALESCE(stats.chunk_count, 0) AS chunk_count,
-          COALESCE(stats.embedded_chunk_count, 0) AS embedded_chunk_count
-        FROM documents d
-        LEFT JOIN LATERAL (
-          SELECT
-            count(*) AS chunk_count,
-            count(*) FILTER (WHERE c.embedding IS NOT NULL) AS embedded_chunk_count
-          FROM chunks c
-          WHERE c.document_id = d.id
-        ) stats ON true
-        WHERE d.user_id = $1
-          AND d.deleted_at IS NULL
-        ORDER BY d.created_at DESC, d.id DESC
-        LIMIT $2
-        OFFSET $3
-        """,
+        _LIST_DOCUMENTS_SQL,
         user_id,
         limit,
         offset,
     )
-    return rows
+    if rows:
+        total = int(rows[0]["total"])
+        for row in rows:
+            del row["total"]
+        return rows, total
+    if offset == 0:
+        return [], 0
+
+    row = await db.fetch_record(
+        """
+        SELECT count(*) AS total
+        FROM documents
+        WHERE user_id = $1
+          AND deleted_at IS NULL
+        """,
+        user_id,
+    )
+    return [], int(row["total"]) if row is not None else 0
 
 
 async def soft_delete_document(document_id: int, *, user_id: int) -> dict[str, Any] | None:
@@ -87,7 +91,7 @@ async def soft_delete_document(document_id: int, *, user_id: int) -> dict[str, A
 
 
 async def document_belongs_to_user(document_id: int, *, user_id: int) -> bool:
-    row = await db.fetch_one(
+    row = await db.fetch_record(
         """
         SELECT 1 AS ok
         FROM documents
@@ -102,80 +106,195 @@ async def document_belongs_to_user(document_id: int, *, user_id: int) -> bool:
     return row is not None
 
 
+_CLAIM_CHUNKS_SQL = db.hot_query(
+    """
+    WITH claimable AS (
+      SELECT c.id
+      FROM chunks c
+      JOIN documents d ON d.id = c.document_id
+      WHERE c.document_id = $1
+        AND d.user_id = $2
+        AND d.deleted_at IS NULL
+        AND c.embedding IS NULL
+        AND (c.embedded_at IS NULL OR c.embedded_at < now() - make_interval(secs => $4))
+      ORDER BY c.chunk_index
+      LIMIT $3
+      FOR UPDATE OF c SKIP LOCKED
+    )
+    UPDATE chunks c
+    SET embedded_at = now()
+    FROM claimable
+    WHERE c.id = claimable.id
+    RETURNING c.id, c.chunk_index, c.text
+    """
+)
+
+
 async def fetch_chunks_needing_embedding(
     document_id: int,
     *,
     user_id: int,
     limit: int,
-) -> list[dict[str, Any]]:
+    lease_s: float,
+) -> list[asyncpg.Record]:
     """
-    Fetch chunk rows that still need embeddings.
+    Claim and return chunk rows that still need embeddings.
+
+    Claiming stamps `embedded_at` on rows whose embedding is still NULL, so
+    concurrent embedders (SKIP LOCKED) never pick up the same rows. A claim
+    older than `lease_s` seconds is treated as abandoned and can be taken
+    again, which keeps the work resumable after a crash. On an ordinary
+    failure the embedder releases its claims (release_chunk_claims).
+
+    Rows are returned as asyncpg Records; the embed loop only reads
+    row["id"] / row["text"], so there is no need for a dict copy per batch.
     """
-    rows = await db.fetch_all(
-        """
-        SELECT c.id, c.chunk_index, c.text
-        FROM chunks c
-        JOIN documents d ON d.id = c.document_id
-        WHERE c.document_id = $1
-          AND d.user_id = $2
-          AND d.deleted_at IS NULL
-          AND c.embedding IS NULL
-        ORDER BY c.chunk_index
-        LIMIT $3
-        """,
+    rows = await db.pool().fetch(
+        _CLAIM_CHUNKS_SQL,
         document_id,
         user_id,
         limit,
+        float(lease_s),
     )
     return rows
 
 
-async def count_chunks_needing_embedding(document_id: int, *, user_id: int) -> int:
-    row = await db.fetch_one(
+async def release_chunk_claims(document_id: int, chunk_ids: list[int]) -> None:
+    """
+    Drop the claim stamp from chunks that were claimed but never embedded,
+    so they can be claimed again right away instead of after the lease.
+    """
+    if not chunk_ids:
+        return
+    await db.execute(
         """
-        SELECT count(*) AS n
-        FROM chunks c
-        JOIN documents d ON d.id = c.document_id
-        WHERE c.document_id = $1
-          AND d.user_id = $2
-          AND d.deleted_at IS NULL
-          AND c.embedding IS NULL
+        UPDATE chunks
+        SET embedded_at = NULL
+        WHERE document_id = $1
+          AND id = ANY($2::bigint[])
+          AND embedding IS NULL
         """,
         document_id,
-        user_id,
+        chunk_ids,
     )
-    return int((row or {}).get("n", 0))
+
+
+async def count_remaining_chunks(document_id: int) -> int:
+    """
+    Chunks of a document still missing an embedding, from the document counters.
+    """
+    row = await db.fetch_record(
+        """
+        SELECT chunk_count - embedded_chunk_count AS remaining
+        FROM documents
+        WHERE id = $1
+        """,
+        document_id,
+    )
+    return int(row["remaining"]) if row is not None else 0
+
+
+_UPDATE_CHUNK_EMBEDDINGS_SQL = db.hot_query(
+    """
+    WITH updated AS (
+      UPDATE chunks c
+      SET embedding = v.embedding,
+          embedding_model = $3,
+          embedded_at = now()
+      FROM unnest($1::bigint[], $2::vector[]) AS v(id, embedding)
+      WHERE c.id = v.id
+        AND c.document_id = $4
+        AND c.embedding IS NULL
+      RETURNING 1
+    ),
+    embedded AS (
+      SELECT count(*) AS n FROM updated
+    ),
+    bumped AS (
+      UPDATE documents
+      SET embedded_chunk_count = embedded_chunk_count + (SELECT n FROM embedded)
+      WHERE id = $4
+      RETURNING chunk_count, embedded_chunk_count
+    )
+    SELECT
+      embedded.n AS embedded,
+      bumped.chunk_count - bumped.embedded_chunk_count AS remaining
+    FROM embedded, bumped
+    """
+)
 
 
 async def update_chunk_embeddings(
+    document_id: int,
     updates: list[tuple[int, list[float]]],
     *,
     model: str,
-) -> None:
+) -> tuple[int, int]:
     """
-    Bulk update chunk embeddings.
+    Bulk update chunk embeddings of one document.
 
     `updates` is [(chunk_id, embedding_vector), ...]
+    Returns (embedded, remaining): rows written by this call and chunks of the
+    document still missing an embedding afterwards.
     """
-    if not updates:
-        return
+    ids = [chunk_id for (chunk_id, _vec) in updates]
+    # Vectors go over the wire in pgvector's binary format (see core.db). Each
+    # one is a tuple so asyncpg treats it as one array element, not a sub-array.
+    vectors = [tuple(vec) for (_chunk_id, vec) in updates]
+
+    # One statement for the whole batch instead of one UPDATE per chunk. It
+    # also bumps the document's embedded counter and returns what is left.
+    row = await db.fetch_record(
+        _UPDATE_CHUNK_EMBEDDINGS_SQL,
+        ids,
+        vectors,
+        model,
+        document_id,
+    )
+    if row is None:
+        return 0, 0
+    return int(row["embedded"]), int(row["remaining"])
 
-    records = [(chunk_id, _vector_literal(vec), model) for (chunk_id, vec) in updates]
 
-    pool = db.pool()
-    async with pool.acquire() as conn:  # type: asyncpg.Connection
-        async with conn.transaction():
-            await conn.executemany(
-                """
-                UPDATE chunks
-                SET embedding = $2::vector,
-                    embedding_model = $3,
-                    embedded_at = now()
-                WHERE id = $1
-                  AND embedding IS NULL
-                """,
-                records,
-            )
+async def fetch_cached_embeddings(hashes: list[bytes]) -> dict[bytes, list[float]]:
+    """
+    Look up cached embeddings by content hash. Returns {hash: vector} for hits.
+    """
+    if not hashes:
+        return {}
+    rows = await db.fetch_all(
+        """
+        SELECT hash, embedding
+        FROM embedding_cache
+        WHERE hash = ANY($1::bytea[])
+        """,
+        hashes,
+    )
+    return {bytes(row["hash"]): row["embedding"] for row in rows}
+
+
+async def insert_cached_embeddings(entries: list[tuple[bytes, list[float]]], *, model: str) -> None:
+    """
+    Store freshly computed embeddings; existing hashes are left untouched.
+
+    `entries` is [(hash, embedding_vector), ...]
+    """
+    if not entries:
+        return
+
+    hashes = [h for (h, _vec) in entries]
+    vectors = [tuple(vec) for (_h, vec) in entries]
+    await db.execute(
+        """
+        INSERT INTO embedding_cache (hash, model, embedding)
+        SELECT v.hash, $3, v.embedding
+        FROM unnest($1::bytea[], $2::vector[]) AS v(hash, embedding)
+        ON CONFLICT (hash) DO NOTHING
+        """,
+        hashes,
+        vectors,
+        model,
+    )
 
 
 async def insert_document_and_chunks(
@@ -201,8 +320,10 @@ async def insert_document_and_chunks(
         async with conn.transaction():
             row = await conn.fetchrow(
                 """
-                INSERT INTO documents (user_id, filename, content_type, size_bytes, extracted_text, metadata)
-                VALUES ($1, $2, $3, $4, $5, COALESCE($6::jsonb, '{}'::jsonb))
+                INSERT INTO documents (
+                  user_id, filename, content_type, size_bytes, extracted_text, metadata, chunk_count
+                )
+                VALUES ($1, $2, $3, $4, $5, COALESCE($6, '{}'::jsonb), $7)
                 RETURNING id
                 """,
                 user_id,
@@ -210,18 +331,20 @@ async def insert_document_and_chunks(
                 content_type,
                 size_bytes,
                 extracted_text,
-                _json_arg(metadata),
+                metadata,
+                len(chunks),
             )
             if row is None or "id" not in row:
                 raise RuntimeError("Failed to insert document.")
 
             document_id = int(row["id"])
 
-            # Bulk insert chunks.
+            # Bulk insert chunks with a single binary COPY.
             records = [(document_id, i, text) for i, text in enumerate(chunks)]
-            await conn.executemany(
-                "INSERT INTO chunks (document_id, chunk_index, text) VALUES ($1, $2, $3)",
-                records,
+            await conn.copy_records_to_table(
+                "chunks",
+                records=records,
+                columns=("document_id", "chunk_index", "text"),
             )
 
             return document_id, len(records)
@@ -245,7 +368,7 @@ async def insert_document(
     row = await db.fetch_one(
         """
         INSERT INTO documents (user_id, filename, content_type, size_bytes, extracted_text, metadata)
-        VALUES ($1, $2, $3, $4, $5, COALESCE($6::jsonb, '{}'::jsonb))
+        VALUES ($1, $2, $3, $4, $5, COALESCE($6, '{}'::jsonb))
         RETURNING id
         """,
         user_id,
@@ -253,7 +376,7 @@ async def insert_document(
         content_type,
         size_bytes,
         extracted_text,
-        _json_arg(metadata),
+        metadata,
     )
     if row is None or "id" not in row:
         raise RuntimeError("Failed to insert document.")
@@ -24,7 +24,7 @@ async def list_documents(
     """
     List current user's active documents (soft-deleted docs are excluded).
     """
-    documents = await repository.list_documents(
+    documents, total = await repository.list_documents(
         user_id=int(current_user["id"]),
         limit=limit,
         offset=offset,
@@ -34,6 +34,7 @@ async def list_documents(
         "limit": limit,
         "offset": offset,
         "count": len(documents),
+        "total": total,
     }
 
 
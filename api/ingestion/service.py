@@ -9,8 +9,11 @@ This file contains logic that is independent of FastAPI's routing layer:
 
 from __future__ import annotations
 
+import asyncio
 import io
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -23,6 +26,59 @@ ALLOWED_EXTENSIONS = {".txt", ".pdf"}
 # Keep this conservative in dev; you can raise it later.
 DEFAULT_MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10 MiB
 
+# PDFs above this size are parsed in a worker process instead of a thread.
+DEFAULT_PDF_PROCESS_MIN_BYTES = 2_000_000
+
+_pdf_pool: ProcessPoolExecutor | None = None
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def pdf_process_workers() -> int:
+    """
+    PDF_PROCESS_WORKERS: size of the PDF parsing process pool (0 disables it).
+    """
+    return max(0, _env_int("PDF_PROCESS_WORKERS", os.cpu_count() or 1))
+
+
+def pdf_process_min_bytes() -> int:
+    return max(0, _env_int("PDF_PROCESS_MIN_BYTES", DEFAULT_PDF_PROCESS_MIN_BYTES))
+
+
+def init_pdf_pool() -> ProcessPoolExecutor | None:
+    """
+    Create the process pool used for large PDFs.
+
+    FastAPI calls this on startup and `close_pdf_pool()` on shutdown (see
+    `api/main.py`). Workers are spawned lazily on first use.
+    """
+    global _pdf_pool
+    workers = pdf_process_workers()
+    if _pdf_pool is None and workers > 0:
+        # spawn: forking a process that already runs the event loop and
+        # driver threads is not safe.
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pdf_pool
+
+
+def close_pdf_pool() -> None:
+    global _pdf_pool
+    if _pdf_pool is None:
+        return None
+    _pdf_pool.shutdown(wait=False, cancel_futures=True)
+    _pdf_pool = None
+
 
 @dataclass(frozen=True)
 class IngestResult:
@@ -76,21 +132,26 @@ async def read_upload_bytes(file: UploadFile, max_bytes: int) -> bytes:
     This is simplest to start with. If you later accept larger files,
     switch to streaming to disk/object storage instead of buffering in RAM.
     """
-    chunk_size = 1024 * 1024  # 1 MiB
-    buf = bytearray()
-
-    while True:
-        chunk = await file.read(chunk_size)
-        if not chunk:
-            break
-        buf.extend(chunk)
-        if len(buf) > max_bytes:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large. Max is {max_bytes} bytes.",
-            )
-
-    return bytes(buf)
+    # Starlette records the spooled size; reject oversize uploads before reading.
+    size = getattr(file, "size", None)
+    if size is not None and size > max_bytes:
+        raise _too_large(max_bytes)
+
+    # One read of the whole spooled file. UploadFile reads an in-memory spool
+    # directly and only hops to the threadpool once the spool rolled to disk.
+    # The extra byte detects oversize uploads when the size is unknown.
+    await file.seek(0)
+    data = await file.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise _too_large(max_bytes)
+    return data
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. Max is {max_bytes} bytes.",
+    )
 
 
 async def ingest_upload(file: UploadFile) -> IngestResult:
@@ -103,7 +164,11 @@ async def ingest_upload(file: UploadFile) -> IngestResult:
     max_bytes = max_upload_bytes_from_env()
 
     data = await read_upload_bytes(file, max_bytes=max_bytes)
-    text = extract_text(ext, data)
+    if ext == ".pdf":
+        # PDF parsing is CPU-bound; keep it off the event loop.
+        text = await _extract_pdf_text_offloaded(data)
+    else:
+        text = extract_text(ext, data)
 
     return IngestResult(
         filename=file.filename or "",
@@ -132,6 +197,30 @@ def extract_text(ext: str, data: bytes) -> str:
     raise HTTPException(status_code=400, detail=f"Unsupported extension: {ext}")
 
 
+async def _extract_pdf_text_offloaded(data: bytes) -> str:
+    """
+    Parse large PDFs in the process pool (real parallelism, no GIL contention
+    with request handling); smaller ones in a thread.
+    """
+    if _pdf_pool is None or len(data) < pdf_process_min_bytes():
+        return await asyncio.to_thread(_extract_pdf_text, data)
+
+    loop = asyncio.get_running_loop()
+    text, status_code = await loop.run_in_executor(_pdf_pool, _extract_pdf_text_worker, data)
+    if status_code is not None:
+        raise HTTPException(status_code=status_code, detail=text)
+    return text
+
+
+def _extract_pdf_text_worker(data: bytes) -> tuple[str, int | None]:
+    # HTTPException does not pickle, so errors cross the process boundary
+    # as (detail, status_code).
+    try:
+        return _extract_pdf_text(data), None
+    except HTTPException as e:
+        return str(e.detail), e.status_code
+
+
 def _extract_pdf_text(data: bytes) -> str:
     """
     PDF text extraction using `pypdf` if available.
@@ -173,15 +262,7 @@ def _extract_pdf_text(data: bytes) -> str:
                 detail="Encrypted PDF is not supported.",
             )
 
-    parts: list[str] = []
-    for page in reader.pages:
-        try:
-            parts.append(page.extract_text() or "")
-        except Exception:
-            # Best-effort extraction: a single bad page shouldn't take down ingestion.
-            parts.append("")
-
-    text = "\n".join(parts).strip()
+    text = "\n".join([_page_text(page) for page in reader.pages]).strip()
     if not text:
         raise HTTPException(
             status_code=422,
@@ -190,6 +271,15 @@ def _extract_pdf_text(data: bytes) -> str:
 
     return text
 
+
+def _page_text(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        # Best-effort extraction: a single bad page shouldn't take down ingestion.
+        return ""
+
+
 def max_upload_bytes_from_env() -> int:
     """
     Read MAX_UPLOAD_BYTES from env, falling back to a sane default.
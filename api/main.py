@@ -4,19 +4,27 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from auth import router as auth_router
-from core import db
+from core import db, ollama
 from generation import router as generation_router
 from ingestion import router as ingestion_router
+from ingestion import service as ingestion_service
 from models import router as models_router
 from retrieval import router as retrieval_router
+from retrieval import service as retrieval_service
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
-    # Initialize the DB pool once per process.
+    # Initialize the DB pool, the Ollama HTTP client and the PDF worker pool
+    # once per process.
     await db.init_pool()
+    await retrieval_service.check_indexes()
+    ollama.init_client()
+    ingestion_service.init_pdf_pool()
     try:
         yield
     finally:
+        ingestion_service.close_pdf_pool()
+        await ollama.close_client()
         await db.close_pool()
 
 
@@ -30,8 +38,10 @@ app.add_middleware(
         "http://127.0.0.1:5173",
     ],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # Explicit lists: preflights become plain membership checks instead of
+    # echoing back whatever the browser asks for.
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["authorization", "content-type"],
 )
 
 app.include_router(ingestion_router, tags=["ingestion"])
@@ -43,7 +53,10 @@ app.include_router(auth_router.router, tags=["auth"])
 
 @app.get("/health")
 def health() -> dict:
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "query_embedding_cache": retrieval_service.query_embedding_cache_stats(),
+    }
 
 
 @app.get("/")
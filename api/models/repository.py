@@ -37,15 +37,20 @@ async def list_available_models(
     )
 
 
+_IS_ALLOWED_MODEL_SQL = db.hot_query(
+    """
+    SELECT 1 AS ok
+    FROM llm_models
+    WHERE name = $1
+      AND is_enabled = true
+    LIMIT 1
+    """
+)
+
+
 async def is_allowed_model(model_name: str) -> bool:
-    row = await db.fetch_one(
-        """
-        SELECT 1 AS ok
-        FROM llm_models
-        WHERE name = $1
-          AND is_enabled = true
-        LIMIT 1
-        """,
+    row = await db.fetch_record(
+        _IS_ALLOWED_MODEL_SQL,
         model_name,
     )
     return row is not None
@@ -5,8 +5,10 @@ Model-management API endpoints.
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 
 from auth import dependencies as auth_dependencies
+from core.sse import sse_response
 
 from . import schemas, service
 
@@ -79,3 +81,16 @@ async def pull_model(
 ) -> dict:
     result = await service.pull_model(request.model)
     return result
+
+
+@router.post("/models/pull/stream")
+async def pull_model_stream(
+    request: schemas.PullModelRequest,
+    _: dict = Depends(auth_dependencies.get_current_user),
+) -> StreamingResponse:
+    """
+    Same as POST /models/pull, but streams Ollama's download progress as
+    server-sent events (`progress` events, then a final `done` or `error` event).
+    """
+    model_name = await service.validate_pull_model(request.model)
+    return sse_response(service.stream_pull_model(model_name))
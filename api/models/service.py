@@ -9,102 +9,127 @@ Scope:
 
 from __future__ import annotations
 
+import asyncio
 import os
+import time
+from collections.abc import AsyncIterator
+from functools import lru_cache
 from typing import Any
 
-import httpx
+import orjson
 from fastapi import HTTPException
 
+from core import ollama
+from generation import service as generation_service
+
 from . import repository
 
 
+# Installed models change rarely (only via pull); cache /api/tags briefly.
+INSTALLED_MODELS_TTL_S = 5.0
+_installed_models_cache: tuple[float, list[dict]] | None = None
+_installed_models_lock = asyncio.Lock()
+
+
+@lru_cache(maxsize=1)
 def ollama_base_url() -> str:
     return os.environ.get("OLLAMA_BASE_URL", "http://ollama:11434").strip() or "http://ollama:11434"
 
 
+@lru_cache(maxsize=1)
 def generation_model_env_default() -> str:
     return os.environ.get("GENERATION_MODEL", "qwen2.5:3b-instruct").strip() or "qwen2.5:3b-instruct"
 
 
+@lru_cache(maxsize=1)
 def router_model_env_default() -> str:
     return os.environ.get("GENERATION_ROUTER_MODEL", "").strip() or generation_model_env_default()
 
 
+@lru_cache(maxsize=1)
+def _default_model_names() -> frozenset[str]:
+    return frozenset({generation_model_env_default(), router_model_env_default()})
+
+
 async def available_models(
     *,
     search_query: str = "",
     similarity_threshold: float = 0.2,
 ) -> list[dict]:
+    # Rows come back typed and in response shape (all columns are NOT NULL).
     rows = await repository.list_available_models(
         search_query=search_query,
         similarity_threshold=max(0.0, min(similarity_threshold, 1.0)),
     )
 
-    default_names = {generation_model_env_default(), router_model_env_default()}
-    existing = {str(row["name"]).strip() for row in rows}
+    existing = {row["name"].strip() for row in rows}
     q = (search_query or "").strip().lower()
-    for default_name in default_names:
+    for default_name in _default_model_names():
         if not default_name or default_name in existing:
             continue
-
-        lower_name = default_name.lower()
-        if q and (q not in lower_name):
+        if q and q not in default_name.lower():
             continue
+        rows.append(
+            {
+                "id": 0,
+                "name": default_name,
+                "is_enabled": True,
+                "is_active": False,
+                "created_at": None,
+                "updated_at": None,
+            }
+        )
+        existing.add(default_name)
 
-        if default_name and default_name not in existing:
-            rows.append(
-                {
-                    "id": 0,
-                    "name": default_name,
-                    "is_enabled": True,
-                    "is_active": False,
-                    "created_at": None,
-                    "updated_at": None,
-                }
-            )
-            existing.add(default_name)
-
-    return [
-        {
-            "id": int(row["id"]),
-            "name": str(row["name"]),
-            "is_enabled": bool(row["is_enabled"]),
-            "is_active": bool(row["is_active"]),
-            "created_at": row["created_at"],
-            "updated_at": row["updated_at"],
-        }
-        for row in rows
-    ]
+    return rows
 
 
-def _parse_tags_payload(data: dict[str, Any]) -> list[dict]:
-    models = data.get("models")
+def _parse_tags_payload(data: Any) -> list[dict]:
+    models = data.get("models") if isinstance(data, dict) else None
     if not isinstance(models, list):
         return []
 
-    parsed: list[dict] = []
-    for item in models:
-        if not isinstance(item, dict):
-            continue
-        name = str(item.get("name") or "").strip()
-        if not name:
-            continue
-        parsed.append(
-            {
-                "name": name,
-                "size": item.get("size"),
-                "digest": item.get("digest"),
-                "modified_at": item.get("modified_at"),
-            }
-        )
-    return parsed
+    return [
+        {
+            "name": name,
+            "size": item.get("size"),
+            "digest": item.get("digest"),
+            "modified_at": item.get("modified_at"),
+        }
+        for item in models
+        if isinstance(item, dict) and (name := str(item.get("name") or "").strip())
+    ]
 
 
 async def installed_models() -> list[dict]:
+    """
+    Models installed in Ollama, cached for a few seconds. Concurrent callers
+    on a cold cache share one /api/tags request.
+    """
+    global _installed_models_cache
+    cached = _installed_models_cache
+    if cached is not None and time.monotonic() - cached[0] < INSTALLED_MODELS_TTL_S:
+        return list(cached[1])
+
+    async with _installed_models_lock:
+        cached = _installed_models_cache
+        if cached is not None and time.monotonic() - cached[0] < INSTALLED_MODELS_TTL_S:
+            return list(cached[1])
+        models = await _fetch_installed_models()
+        _installed_models_cache = (time.monotonic(), models)
+    return list(models)
+
+
+def invalidate_installed_models() -> None:
+    global _installed_models_cache
+    _installed_models_cache = None
+
+
+async def _fetch_installed_models() -> list[dict]:
     base_url = ollama_base_url()
     try:
-        async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
-            resp = await client.get("/api/tags")
+        # Shared keep-alive client (see core.ollama); no per-call pool setup.
+        resp = await ollama.get_client().get(f"{base_url}/api/tags", timeout=30.0)
     except Exception as exc:
         raise HTTPException(status_code=502, detail=f"Failed to call Ollama tags endpoint: {exc}") from exc
 
@@ -114,23 +139,25 @@ async def installed_models() -> list[dict]:
             detail=f"Ollama tags request failed with status {resp.status_code}: {resp.text[:300]}",
         )
 
-    data: dict[str, Any] = resp.json()
+    try:
+        data = orjson.loads(resp.content)
+    except orjson.JSONDecodeError as exc:
+        raise HTTPException(status_code=502, detail="Ollama tags endpoint returned invalid JSON.") from exc
     return _parse_tags_payload(data)
 
 
-async def _installed_name_set() -> set[str]:
-    installed_set = {str(item.get("name") or "").strip() for item in await installed_models()}
-    installed_set.discard("")
-    return installed_set
+async def _installed_name_set() -> frozenset[str]:
+    # _parse_tags_payload only emits stripped, non-empty names.
+    return frozenset(item["name"] for item in await installed_models())
 
 
 def _is_allowed_or_default(model_name: str, *, is_allowed: bool) -> bool:
-    defaults = {generation_model_env_default(), router_model_env_default()}
-    return is_allowed or model_name in defaults
+    return is_allowed or model_name in _default_model_names()
 
 
 async def model_config() -> dict:
-    row = await repository.get_model_settings()
+    # Independent lookups (Postgres, Ollama): run them concurrently.
+    row, installed_set = await asyncio.gather(repository.get_model_settings(), _installed_name_set())
     if row is None:
         generation_model = generation_model_env_default()
         router_model = router_model_env_default()
@@ -140,7 +167,6 @@ async def model_config() -> dict:
         router_model = str(row["router_model"]).strip()
         source = "db"
 
-    installed_set = await _installed_name_set()
     return {
         "generation_model": generation_model,
         "router_model": router_model,
@@ -168,11 +194,10 @@ async def select_generation_model(model_name: str) -> dict:
     if not _is_allowed_or_default(model_name, is_allowed=is_allowed):
         raise HTTPException(status_code=400, detail="Model is not in allowed model list.")
 
-    installed_set = await _installed_name_set()
+    installed_set, current = await asyncio.gather(_installed_name_set(), repository.get_model_settings())
     if model_name not in installed_set:
         raise HTTPException(status_code=400, detail="Model is not installed. Install it first.")
 
-    current = await repository.get_model_settings()
     next_router_model = (
         str(current["router_model"]).strip()
         if current is not None
@@ -182,6 +207,7 @@ async def select_generation_model(model_name: str) -> dict:
         generation_model=model_name,
         router_model=next_router_model,
     )
+    generation_service.invalidate_selected_models()
     return {
         "generation_model": str(updated["generation_model"]),
         "router_model": str(updated["router_model"]),
@@ -198,11 +224,10 @@ async def select_router_model(model_name: str) -> dict:
     if not _is_allowed_or_default(model_name, is_allowed=is_allowed):
         raise HTTPException(status_code=400, detail="Model is not in allowed model list.")
 
-    installed_set = await _installed_name_set()
+    installed_set, current = await asyncio.gather(_installed_name_set(), repository.get_model_settings())
     if model_name not in installed_set:
         raise HTTPException(status_code=400, detail="Model is not installed. Install it first.")
 
-    current = await repository.get_model_settings()
     next_generation_model = (
         str(current["generation_model"]).strip()
         if current is not None
@@ -212,6 +237,7 @@ async def select_router_model(model_name: str) -> dict:
         generation_model=next_generation_model,
         router_model=model_name,
     )
+    generation_service.invalidate_selected_models()
     return {
         "generation_model": str(updated["generation_model"]),
         "router_model": str(updated["router_model"]),
@@ -229,7 +255,12 @@ async def select_active_model(model_name: str) -> dict:
     }
 
 
-async def pull_model(model_name: str) -> dict:
+async def validate_pull_model(model_name: str) -> str:
+    """
+    Returns the cleaned model name, or raises 400 if it may not be pulled.
+    Streaming callers run this before the response starts; after that,
+    errors can only be reported as events.
+    """
     model_name = (model_name or "").strip()
     if not model_name:
         raise HTTPException(status_code=400, detail="Model name is required.")
@@ -237,26 +268,58 @@ async def pull_model(model_name: str) -> dict:
     is_allowed = await repository.is_allowed_model(model_name)
     if not _is_allowed_or_default(model_name, is_allowed=is_allowed):
         raise HTTPException(status_code=400, detail="Model is not in allowed model list.")
+    return model_name
 
-    base_url = ollama_base_url()
+
+def _pull_result(model_name: str, status: str | None) -> dict:
+    return {
+        "model": model_name,
+        "status": status or "ok",
+        "done": status == "success",
+    }
+
+
+async def pull_model(model_name: str) -> dict:
+    """
+    Pull a model and return once Ollama finishes.
+
+    The download is read as a stream, so a long pull doesn't sit on one
+    multi-minute read and a client disconnect cancels it.
+    """
+    model_name = await validate_pull_model(model_name)
+
+    status: str | None = None
     try:
-        async with httpx.AsyncClient(base_url=base_url, timeout=600.0) as client:
-            resp = await client.post(
-                "/api/pull",
-                json={"model": model_name, "stream": False},
-            )
+        async for event in ollama.pull_stream(base_url=ollama_base_url(), model=model_name):
+            status = event.get("status") or status
+    except ollama.OllamaError as exc:
+        raise HTTPException(status_code=502, detail=str(exc)) from exc
     except Exception as exc:
         raise HTTPException(status_code=502, detail=f"Failed to call Ollama pull endpoint: {exc}") from exc
 
-    if resp.status_code != 200:
-        raise HTTPException(
-            status_code=502,
-            detail=f"Ollama pull request failed with status {resp.status_code}: {resp.text[:300]}",
-        )
+    # The new model must show up as installed right away.
+    invalidate_installed_models()
+    return _pull_result(model_name, status)
 
-    data: dict[str, Any] = resp.json()
-    return {
-        "model": model_name,
-        "status": data.get("status") or "ok",
-        "done": bool(data.get("done", False)),
-    }
+
+async def stream_pull_model(model_name: str) -> AsyncIterator[tuple[str, dict[str, Any]]]:
+    """
+    Pull a validated model as (event, data) pairs:
+    - ("progress", {"status", "digest"?, "total"?, "completed"?}) per Ollama status line
+    - ("done", {...}) with the same fields as pull_model()
+    - ("error", {"detail": ...}) if the pull fails
+    """
+    status: str | None = None
+    try:
+        async for event in ollama.pull_stream(base_url=ollama_base_url(), model=model_name):
+            status = event.get("status") or status
+            yield "progress", event
+    except ollama.OllamaError as exc:
+        yield "error", {"detail": str(exc)}
+        return
+    except Exception as exc:
+        yield "error", {"detail": f"Failed to call Ollama pull endpoint: {exc}"}
+        return
+
+    invalidate_installed_models()
+    yield "done", _pull_result(model_name, status)
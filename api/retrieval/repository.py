@@ -4,25 +4,96 @@ Retrieval SQL (raw).
 This module contains Postgres queries for:
 - full-text search (FTS) over `chunks.tsv`
 - vector search over `chunks.embedding`
-- hybrid ranking (FTS + vector) with rank fusion in SQL
+- the two hybrid candidate sets and the previews of the fused top rows
+  (rank fusion itself happens in the service)
+
+Query vectors are passed as float sequences (list or array("f")); the pgvector codec in
+`core.db` sends them in binary. The `$n::vector` casts only pin the type.
+
+All queries are registered with `db.hot_query`, so every pool connection
+has them in its statement cache before the first search runs.
+
+Indexes the queries rely on (see EXPECTED_INDEXES; checked at startup):
+- FTS: chunks_tsv_gin_idx for `tsv @@ tsq`
+- vector: chunks_embedding_halfvec_hnsw_cosine_idx, a half-precision HNSW
+  index for `ORDER BY embedding::halfvec(768) <=> $n LIMIT k`; the candidates
+  it returns are re-ranked by the full-precision distance
+- all: documents_user_id_active_created_at_idx for the user's visible
+  documents, chunks_document_id_idx to reach their chunks
 """
 
 from __future__ import annotations
 
+from collections.abc import Sequence
 from typing import Any
 
 from core import db
 
 
-def _vector_literal(vec: list[float]) -> str:
-    """
-    Serialize a Python list of floats into a pgvector literal: "[1.0,2.0,...]".
+TEXT_PREVIEW_CHARS = 120
+
+# index name -> DDL that recreates it (the dbmate migrations create all of them).
+EXPECTED_INDEXES: dict[str, str] = {
+    "chunks_tsv_gin_idx": "CREATE INDEX CONCURRENTLY chunks_tsv_gin_idx ON chunks USING gin (tsv);",
+    "chunks_embedding_halfvec_hnsw_cosine_idx": (
+        "CREATE INDEX CONCURRENTLY chunks_embedding_halfvec_hnsw_cosine_idx ON chunks "
+        "USING hnsw ((embedding::halfvec(768)) halfvec_cosine_ops) WHERE embedding IS NOT NULL;"
+    ),
+    "chunks_document_id_idx": "CREATE INDEX CONCURRENTLY chunks_document_id_idx ON chunks (document_id);",
+    "documents_user_id_active_created_at_idx": (
+        "CREATE INDEX CONCURRENTLY documents_user_id_active_created_at_idx ON documents "
+        "(user_id, created_at DESC) WHERE user_id IS NOT NULL AND deleted_at IS NULL;"
+    ),
+}
 
-    We pass this as text and cast it to `vector` in SQL ($n::vector).
+
+async def missing_indexes() -> list[str]:
+    """
+    Names from EXPECTED_INDEXES that don't exist on chunks/documents.
     """
-    return "[" + ",".join(repr(float(x)) for x in vec) + "]"
+    rows = await db.fetch_all(
+        """
+        SELECT indexname
+        FROM pg_indexes
+        WHERE schemaname = current_schema()
+          AND tablename IN ('chunks', 'documents')
+        """
+    )
+    present = {row["indexname"] for row in rows}
+    return [name for name in EXPECTED_INDEXES if name not in present]
 
-TEXT_PREVIEW_CHARS = 120
+
+_SEARCH_FTS_SQL = db.hot_query(
+    """
+    WITH q AS (
+      SELECT websearch_to_tsquery('english', $1) AS tsq
+    )
+    SELECT
+      s.id,
+      s.document_id,
+      s.filename,
+      s.chunk_index,
+      regexp_replace(left(s.text, $3), E'\\s+', ' ', 'g') AS text,
+      s.fts_score
+    FROM (
+      SELECT
+        c.id,
+        c.document_id,
+        d.filename,
+        c.chunk_index,
+        c.text,
+        ts_rank_cd(c.tsv, (SELECT tsq FROM q)) AS fts_score
+      FROM chunks c
+      JOIN documents d ON d.id = c.document_id
+      WHERE c.tsv @@ (SELECT tsq FROM q)
+        AND d.user_id = $2
+        AND d.deleted_at IS NULL
+      ORDER BY fts_score DESC
+      LIMIT $4
+    ) s
+    ORDER BY s.fts_score DESC
+    """
+)
 
 
 async def search_fts(query_text: str, *, user_id: int, limit: int = 10) -> list[dict[str, Any]]:
@@ -30,25 +101,7 @@ async def search_fts(query_text: str, *, user_id: int, limit: int = 10) -> list[
     Full-text search over chunks. Uses websearch syntax (quotes, -, OR, etc).
     """
     return await db.fetch_all(
-        """
-        WITH q AS (
-          SELECT websearch_to_tsquery('english', $1) AS tsq
-        )
-        SELECT
-          c.id,
-          c.document_id,
-          d.filename,
-          c.chunk_index,
-          regexp_replace(left(c.text, $3), E'\\s+', ' ', 'g') AS text,
-          ts_rank_cd(c.tsv, (SELECT tsq FROM q)) AS fts_score
-        FROM chunks c
-        JOIN documents d ON d.id = c.document_id
-        WHERE c.tsv @@ (SELECT tsq FROM q)
-          AND d.user_id = $2
-          AND d.deleted_at IS NULL
-        ORDER BY fts_score DESC
-        LIMIT $4
-        """,
+        _SEARCH_FTS_SQL,
         query_text,
         user_id,
         TEXT_PREVIEW_CHARS,
@@ -56,8 +109,40 @@ async def search_fts(query_text: str, *, user_id: int, limit: int = 10) -> list[
     )
 
 
+_SEARCH_VECTOR_SQL = db.hot_query(
+    """
+    SELECT
+      s.id,
+      s.document_id,
+      s.filename,
+      s.chunk_index,
+      regexp_replace(left(s.text, $4), E'\\s+', ' ', 'g') AS text,
+      s.vec_dist,
+      (1.0::float8 - s.vec_dist) AS vec_sim
+    FROM (
+      SELECT
+        c.id,
+        c.document_id,
+        d.filename,
+        c.chunk_index,
+        c.text,
+        (c.embedding <=> $1::vector) AS vec_dist
+      FROM chunks c
+      JOIN documents d ON d.id = c.document_id
+      WHERE c.embedding IS NOT NULL
+        AND c.embedding_model = $2
+        AND d.user_id = $3
+        AND d.deleted_at IS NULL
+      ORDER BY c.embedding::halfvec(768) <=> $1::vector::halfvec(768)
+      LIMIT $5
+    ) s
+    ORDER BY s.vec_dist ASC
+    """
+)
+
+
 async def search_vector(
-    query_vec: list[float],
+    query_vec: Sequence[float],
     *,
     user_id: int,
     embedding_model: str,
@@ -66,27 +151,9 @@ async def search_vector(
     """
     Vector similarity search over chunk embeddings (cosine distance).
     """
-    qvec = _vector_literal(query_vec)
     return await db.fetch_all(
-        """
-        SELECT
-          c.id,
-          c.document_id,
-          d.filename,
-          c.chunk_index,
-          regexp_replace(left(c.text, $4), E'\\s+', ' ', 'g') AS text,
-          (c.embedding <=> $1::vector) AS vec_dist,
-          (1.0::float8 - (c.embedding <=> $1::vector)) AS vec_sim
-        FROM chunks c
-        JOIN documents d ON d.id = c.document_id
-        WHERE c.embedding IS NOT NULL
-          AND c.embedding_model = $2
-          AND d.user_id = $3
-          AND d.deleted_at IS NULL
-        ORDER BY vec_dist ASC
-        LIMIT $5
-        """,
-        qvec,
+        _SEARCH_VECTOR_SQL,
+        query_vec,
         embedding_model,
         user_id,
         TEXT_PREVIEW_CHARS,
@@ -94,118 +161,112 @@ async def search_vector(
     )
 
 
-async def search_hybrid(
+_HYBRID_FTS_CANDIDATES_SQL = db.hot_query(
+    """
+    SELECT c.id, ts_rank_cd(c.tsv, q.tsq) AS fts_score
+    FROM websearch_to_tsquery('simple', $1) AS q(tsq)
+    CROSS JOIN chunks c
+    JOIN documents d ON d.id = c.document_id
+    WHERE c.tsv @@ q.tsq
+      AND d.user_id = $2
+      AND d.deleted_at IS NULL
+    ORDER BY fts_score DESC, c.id
+    LIMIT $3
+    """
+)
+
+
+async def search_hybrid_fts_candidates(
     query_text: str,
-    query_vec: list[float],
     *,
     user_id: int,
-    embedding_model: str,
-    limit: int = 10,
-    text_chars: int = TEXT_PREVIEW_CHARS,
-    full_text_candidate_limit: int = 50,
-    vector_candidate_limit: int = 50,
-    full_text_weight: float = 0.5,
-    vector_weight: float = 0.5,
-    rrf_rank_constant: int = 60,
+    limit: int = 50,
 ) -> list[dict[str, Any]]:
     """
-    Hybrid search with rank fusion done in Postgres.
-
-    We create two candidate sets:
-    - FTS top full_text_candidate_limit
-    - vector top vector_candidate_limit
+    FTS candidate set for hybrid search: [{id, fts_score}, ...], best first.
 
-    Then fuse them with Reciprocal Rank Fusion (RRF):
-      score = w_fts * 1/(rrf_rank_constant + fts_rank) + w_vec * 1/(rrf_rank_constant + vec_rank)
+    This half needs no query embedding, so the service runs it while the
+    embedding is still being computed.
     """
-    qvec = _vector_literal(query_vec)
     return await db.fetch_all(
-        """
-        WITH
-        q AS (
-          SELECT
-            websearch_to_tsquery('simple', $1) AS tsq,
-            $2::vector AS qvec
-        ),
-        fts AS (
-          SELECT
-            c.id,
-            c.document_id,
-            c.chunk_index,
-            regexp_replace(left(c.text, $3), E'\\s+', ' ', 'g') AS text,
-            ts_rank_cd(c.tsv, (SELECT tsq FROM q)) AS fts_score,
-            row_number() OVER (ORDER BY ts_rank_cd(c.tsv, (SELECT tsq FROM q)) DESC) AS fts_rank
-          FROM chunks c
-          JOIN documents d ON d.id = c.document_id
-          WHERE c.tsv @@ (SELECT tsq FROM q)
-            AND d.user_id = $11
-            AND d.deleted_at IS NULL
-          ORDER BY fts_score DESC
-          LIMIT $4
-        ),
-        vec AS (
-          SELECT
-            c.id,
-            c.document_id,
-            c.chunk_index,
-            regexp_replace(left(c.text, $3), E'\\s+', ' ', 'g') AS text,
-            (c.embedding <=> (SELECT qvec FROM q)) AS vec_dist,
-            row_number() OVER (ORDER BY (c.embedding <=> (SELECT qvec FROM q)) ASC) AS vec_rank
-          FROM chunks c
-          JOIN documents d ON d.id = c.document_id
-          WHERE c.embedding IS NOT NULL
-            AND c.embedding_model = $5
-            AND d.user_id = $11
-            AND d.deleted_at IS NULL
-          ORDER BY vec_dist ASC
-          LIMIT $6
-        ),
-        merged AS (
-          SELECT
-            COALESCE(fts.id, vec.id) AS id,
-            COALESCE(fts.document_id, vec.document_id) AS document_id,
-            COALESCE(fts.chunk_index, vec.chunk_index) AS chunk_index,
-            COALESCE(fts.text, vec.text) AS text,
-            fts.fts_score,
-            fts.fts_rank,
-            vec.vec_dist,
-            vec.vec_rank,
-            COALESCE(1.0::float8 / ($7 + fts.fts_rank), 0.0::float8) AS rrf_fts,
-            COALESCE(1.0::float8 / ($7 + vec.vec_rank), 0.0::float8) AS rrf_vec
-          FROM fts
-          FULL OUTER JOIN vec USING (id)
-        )
-        SELECT
-          m.id,
-          m.document_id,
-          d.filename,
-          m.chunk_index,
-          m.text,
-          m.fts_score::float8 AS fts_score,
-          m.fts_rank::int AS fts_rank,
-          m.vec_dist::float8 AS vec_dist,
-          (1.0::float8 - m.vec_dist)::float8 AS vec_sim,
-          m.vec_rank::int AS vec_rank,
-          m.rrf_fts::float8 AS rrf_fts,
-          m.rrf_vec::float8 AS rrf_vec,
-          (($8::float8 * m.rrf_fts + $9::float8 * m.rrf_vec))::float8 AS hybrid_score,
-          (m.fts_score IS NOT NULL) AS matched_fts,
-          (m.vec_dist IS NOT NULL) AS matched_vec
-        FROM merged m
-        JOIN documents d ON d.id = m.document_id
-        WHERE d.deleted_at IS NULL
-        ORDER BY hybrid_score DESC
-        LIMIT $10
-        """,
+        _HYBRID_FTS_CANDIDATES_SQL,
         query_text,
-        qvec,
-        text_chars,
-        full_text_candidate_limit,
+        user_id,
+        limit,
+    )
+
+
+_HYBRID_VECTOR_CANDIDATES_SQL = db.hot_query(
+    """
+    SELECT s.id, s.vec_dist
+    FROM (
+      SELECT c.id, (c.embedding <=> $1::vector) AS vec_dist
+      FROM chunks c
+      JOIN documents d ON d.id = c.document_id
+      WHERE c.embedding IS NOT NULL
+        AND c.embedding_model = $2
+        AND d.user_id = $3
+        AND d.deleted_at IS NULL
+      ORDER BY c.embedding::halfvec(768) <=> $1::vector::halfvec(768)
+      LIMIT $4
+    ) s
+    ORDER BY s.vec_dist ASC
+    """
+)
+
+
+async def search_hybrid_vector_candidates(
+    query_vec: Sequence[float],
+    *,
+    user_id: int,
+    embedding_model: str,
+    limit: int = 50,
+) -> list[dict[str, Any]]:
+    """
+    Vector candidate set for hybrid search: [{id, vec_dist}, ...], best first.
+    """
+    return await db.fetch_all(
+        _HYBRID_VECTOR_CANDIDATES_SQL,
+        query_vec,
         embedding_model,
-        vector_candidate_limit,
-        rrf_rank_constant,
-        full_text_weight,
-        vector_weight,
+        user_id,
         limit,
+    )
+
+
+_CHUNK_PREVIEWS_SQL = db.hot_query(
+    """
+    SELECT
+      c.id,
+      c.document_id,
+      d.filename,
+      c.chunk_index,
+      regexp_replace(left(c.text, $3), E'\\s+', ' ', 'g') AS text
+    FROM chunks c
+    JOIN documents d ON d.id = c.document_id
+    WHERE c.id = ANY($1::bigint[])
+      AND d.user_id = $2
+      AND d.deleted_at IS NULL
+    """
+)
+
+
+async def fetch_chunk_previews(
+    chunk_ids: list[int],
+    *,
+    user_id: int,
+    text_chars: int = TEXT_PREVIEW_CHARS,
+) -> dict[int, dict[str, Any]]:
+    """
+    Chunk id -> {id, document_id, filename, chunk_index, text} for the user's
+    visible chunks among `chunk_ids` (order is not kept).
+    """
+    if not chunk_ids:
+        return {}
+    rows = await db.fetch_all(
+        _CHUNK_PREVIEWS_SQL,
+        chunk_ids,
         user_id,
+        text_chars,
     )
+    return {row["id"]: row for row in rows}
@@ -17,9 +17,9 @@ router = APIRouter()
 async def search(
     q: str = Query(..., min_length=1),
     limit: int = 10,
-    current_user: dict = Depends(auth_dependencies.get_current_user),
+    user_id: int = Depends(auth_dependencies.get_current_user_id),
 ) -> dict:
-    results = await service.search_fts(q, user_id=int(current_user["id"]), limit=limit)
+    results = await service.search_fts(q, user_id=user_id, limit=limit)
     return {"mode": "fts", "query": q, "results": results}
 
 
@@ -27,9 +27,9 @@ async def search(
 async def search_vector(
     q: str = Query(..., min_length=1),
     limit: int = 10,
-    current_user: dict = Depends(auth_dependencies.get_current_user),
+    user_id: int = Depends(auth_dependencies.get_current_user_id),
 ) -> dict:
-    results = await service.search_vector(q, user_id=int(current_user["id"]), limit=limit)
+    results = await service.search_vector(q, user_id=user_id, limit=limit)
     return {"mode": "vector", "query": q, "results": results}
 
 
@@ -42,11 +42,11 @@ async def search_hybrid(
     full_text_weight: float = Query(0.5, alias="weight_fts", ge=0.0),
     vector_weight: float = Query(0.5, alias="weight_vec", ge=0.0),
     rrf_rank_constant: int = Query(60, alias="rrf_k", ge=1),
-    current_user: dict = Depends(auth_dependencies.get_current_user),
+    user_id: int = Depends(auth_dependencies.get_current_user_id),
 ) -> dict:
     results = await service.search_hybrid(
         q,
-        user_id=int(current_user["id"]),
+        user_id=user_id,
         limit=limit,
         full_text_candidate_limit=full_text_candidate_limit,
         vector_candidate_limit=vector_candidate_limit,
@@ -4,13 +4,22 @@ Retrieval service (orchestration).
 This is where we:
 - generate a query embedding via Ollama (for vector/hybrid search)
 - call Postgres retrieval queries (repository)
+- fuse hybrid candidates with Reciprocal Rank Fusion (RRF)
 """
 
 from __future__ import annotations
 
+import asyncio
+import heapq
+import logging
 import os
+import re
+from array import array
+from collections.abc import Sequence
 from typing import Any
 
+import httpx
+from cachetools import LRUCache
 from fastapi import HTTPException
 
 from core import ollama
@@ -19,6 +28,13 @@ from . import repository
 
 
 EXPECTED_EMBED_DIM = 768
+DEFAULT_QUERY_EMBEDDING_CACHE_MAX = 2048
+
+logger = logging.getLogger(__name__)
+
+# websearch_to_tsquery only builds lexemes from letters/digits; a query
+# without any (punctuation, symbols) parses to an empty tsquery.
+_SEARCH_TERM_RE = re.compile(r"[^\W_]")
 
 
 def _env_int(name: str, default: int) -> int:
@@ -39,21 +55,82 @@ def ollama_base_url() -> str:
     return os.environ.get("OLLAMA_BASE_URL", "http://ollama:11434").strip() or "http://ollama:11434"
 
 
-async def _query_embedding(query: str) -> list[float]:
+async def check_indexes() -> None:
+    """
+    Startup guard: warn (with the DDL to fix it) for each index retrieval
+    relies on that is missing. Without them, search degrades to sequential
+    scans as the corpus grows. Never raises.
+    """
+    try:
+        missing = await repository.missing_indexes()
+    except Exception:
+        logger.warning("retrieval_index_check_failed", exc_info=True)
+        return
+    for name in missing:
+        logger.warning("retrieval_index_missing index=%s fix=%s", name, repository.EXPECTED_INDEXES[name])
+
+
+def query_embedding_cache_max() -> int:
+    """
+    QUERY_EMBEDDING_CACHE_MAX: query embeddings kept in memory (0 disables the cache).
+    """
+    return max(0, _env_int("QUERY_EMBEDDING_CACHE_MAX", DEFAULT_QUERY_EMBEDDING_CACHE_MAX))
+
+
+# (model, normalized query) -> float32 vector (~3 KB each at 768 dims).
+_QUERY_EMBEDDING_CACHE_MAX = query_embedding_cache_max()
+_query_embedding_cache: LRUCache = LRUCache(maxsize=_QUERY_EMBEDDING_CACHE_MAX or 1)
+_query_embedding_hits = 0
+_query_embedding_misses = 0
+
+
+def query_embedding_cache_stats() -> dict[str, int]:
+    return {
+        "hits": _query_embedding_hits,
+        "misses": _query_embedding_misses,
+        "size": len(_query_embedding_cache),
+    }
+
+
+async def _query_embedding(query: str) -> Sequence[float]:
+    global _query_embedding_hits, _query_embedding_misses
+
+    # Whitespace differences don't change what the user asked for; case can
+    # change the embedding, so it is kept.
+    prompt = " ".join(query.split())
+    model = embedding_model()
+    key = (model, prompt)
+    if _QUERY_EMBEDDING_CACHE_MAX:
+        cached = _query_embedding_cache.get(key)
+        if cached is not None:
+            _query_embedding_hits += 1
+            return cached
+        _query_embedding_misses += 1
+
     vec = await ollama.embed_text(
         base_url=ollama_base_url(),
-        model=embedding_model(),
-        prompt=query,
+        model=model,
+        prompt=prompt,
     )
     if len(vec) != EXPECTED_EMBED_DIM:
         raise HTTPException(
             status_code=500,
             detail=f"Embedding dim mismatch: expected {EXPECTED_EMBED_DIM}, got {len(vec)}",
         )
+    if _QUERY_EMBEDDING_CACHE_MAX:
+        # The pgvector codec takes any float sequence; array("f") is a quarter
+        # the size of a list of Python floats.
+        _query_embedding_cache[key] = array("f", vec)
     return vec
 
 
+def _has_search_terms(query: str) -> bool:
+    return _SEARCH_TERM_RE.search(query) is not None
+
+
 async def search_fts(query: str, *, user_id: int, limit: int = 10) -> list[dict[str, Any]]:
+    if not _has_search_terms(query):
+        return []
     return await repository.search_fts(query, user_id=user_id, limit=limit)
 
 
@@ -62,6 +139,47 @@ async def search_vector(query: str, *, user_id: int, limit: int = 10) -> list[di
     return await repository.search_vector(vec, user_id=user_id, embedding_model=embedding_model(), limit=limit)
 
 
+def _fuse_rrf(
+    fts_rows: list[dict[str, Any]],
+    vec_rows: list[dict[str, Any]],
+    *,
+    limit: int,
+    full_text_weight: float,
+    vector_weight: float,
+    rrf_rank_constant: int,
+) -> list[dict[str, Any]]:
+    """
+    Reciprocal Rank Fusion of two candidate lists (each best first):
+      score = w_fts * 1/(rrf_rank_constant + fts_rank) + w_vec * 1/(rrf_rank_constant + vec_rank)
+
+    Returns the top `limit` fused rows (ids and metrics, no text).
+    """
+    fused: dict[int, dict[str, Any]] = {}
+    for rank, row in enumerate(fts_rows, start=1):
+        fused[row["id"]] = {
+            "id": row["id"],
+            "fts_score": float(row["fts_score"]),
+            "fts_rank": rank,
+            "vec_dist": None,
+            "vec_rank": None,
+        }
+    for rank, row in enumerate(vec_rows, start=1):
+        entry = fused.get(row["id"])
+        if entry is None:
+            entry = fused[row["id"]] = {"id": row["id"], "fts_score": None, "fts_rank": None}
+        entry["vec_dist"] = float(row["vec_dist"])
+        entry["vec_rank"] = rank
+
+    for entry in fused.values():
+        rrf_fts = 1.0 / (rrf_rank_constant + entry["fts_rank"]) if entry["fts_rank"] is not None else 0.0
+        rrf_vec = 1.0 / (rrf_rank_constant + entry["vec_rank"]) if entry["vec_rank"] is not None else 0.0
+        entry["rrf_fts"] = rrf_fts
+        entry["rrf_vec"] = rrf_vec
+        entry["hybrid_score"] = full_text_weight * rrf_fts + vector_weight * rrf_vec
+
+    return heapq.nlargest(limit, fused.values(), key=lambda e: e["hybrid_score"])
+
+
 async def search_hybrid(
     query: str,
     *,
@@ -74,17 +192,75 @@ async def search_hybrid(
     vector_weight: float = 0.5,
     rrf_rank_constant: int = 60,
 ) -> list[dict[str, Any]]:
-    vec = await _query_embedding(query)
-    return await repository.search_hybrid(
-        query,
-        vec,
-        user_id=user_id,
-        embedding_model=embedding_model(),
+    """
+    Hybrid search: FTS and vector candidates from Postgres, fused with RRF here.
+
+    Text and filenames are only fetched for the fused top `limit` rows.
+    """
+    has_terms = _has_search_terms(query)
+
+    async def vector_candidates() -> list[dict[str, Any]]:
+        try:
+            vec = await _query_embedding(query)
+        except (ollama.OllamaError, httpx.HTTPError):
+            if not has_terms:
+                raise
+            # Degrade to FTS-only results instead of failing the search.
+            logger.warning("query_embedding_failed; hybrid search continues with FTS only", exc_info=True)
+            return []
+        return await repository.search_hybrid_vector_candidates(
+            vec,
+            user_id=user_id,
+            embedding_model=embedding_model(),
+            limit=vector_candidate_limit,
+        )
+
+    if has_terms:
+        # The FTS candidates don't depend on the query embedding. Each side
+        # runs on its own pool connection, so FTS overlaps both the embedding
+        # call and the vector query: max(fts, embed + vector) instead of the sum.
+        fts_rows, vec_rows = await asyncio.gather(
+            repository.search_hybrid_fts_candidates(query, user_id=user_id, limit=full_text_candidate_limit),
+            vector_candidates(),
+        )
+    else:
+        # Nothing for FTS to match; fusion below works on the vector side alone.
+        fts_rows, vec_rows = [], await vector_candidates()
+
+    top = _fuse_rrf(
+        fts_rows,
+        vec_rows,
         limit=limit,
-        text_chars=text_chars,
-        full_text_candidate_limit=full_text_candidate_limit,
-        vector_candidate_limit=vector_candidate_limit,
         full_text_weight=full_text_weight,
         vector_weight=vector_weight,
         rrf_rank_constant=rrf_rank_constant,
     )
+    previews = await repository.fetch_chunk_previews(
+        [entry["id"] for entry in top],
+        user_id=user_id,
+        text_chars=text_chars,
+    )
+
+    results: list[dict[str, Any]] = []
+    for entry in top:
+        preview = previews.get(entry["id"])
+        if preview is None:
+            # Document deleted between the candidate and preview queries.
+            continue
+        vec_dist = entry["vec_dist"]
+        results.append(
+            {
+                **preview,
+                "fts_score": entry["fts_score"],
+                "fts_rank": entry["fts_rank"],
+                "vec_dist": vec_dist,
+                "vec_sim": 1.0 - vec_dist if vec_dist is not None else None,
+                "vec_rank": entry["vec_rank"],
+                "rrf_fts": entry["rrf_fts"],
+                "rrf_vec": entry["rrf_vec"],
+                "hybrid_score": entry["hybrid_score"],
+                "matched_fts": entry["fts_score"] is not None,
+                "matched_vec": vec_dist is not None,
+            }
+        )
+    return results
@@ -0,0 +1,16 @@
+-- migrate:up
+-- Message timeline reads (recent history, conversation messages, previews)
+-- order by (created_at DESC, id DESC) within a conversation. Match that
+-- ordering exactly so they become plain index scans with no sort step.
+-- Columns are not INCLUDEd: message content can exceed the btree row limit.
+CREATE INDEX IF NOT EXISTS messages_conversation_created_id_idx
+  ON messages (conversation_id, created_at DESC, id DESC);
+
+-- Superseded by the index above.
+DROP INDEX IF EXISTS messages_conversation_id_created_at_idx;
+
+-- migrate:down
+CREATE INDEX IF NOT EXISTS messages_conversation_id_created_at_idx
+  ON messages (conversation_id, created_at);
+
+DROP INDEX IF EXISTS messages_conversation_created_id_idx;
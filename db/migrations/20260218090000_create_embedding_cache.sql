@@ -0,0 +1,12 @@
+-- migrate:up
+-- Embeddings keyed by sha256(model || NUL || text). Identical chunks (headers,
+-- license text, re-uploads) reuse the stored vector instead of calling Ollama.
+CREATE TABLE IF NOT EXISTS embedding_cache (
+  hash        bytea PRIMARY KEY,
+  model       text NOT NULL,
+  embedding   vector(768) NOT NULL,
+  created_at  timestamptz NOT NULL DEFAULT now()
+);
+
+-- migrate:down
+DROP TABLE IF EXISTS embedding_cache;
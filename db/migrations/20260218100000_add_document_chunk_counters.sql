@@ -0,0 +1,26 @@
+-- migrate:up
+-- Per-document chunk counters so document listings don't aggregate over
+-- chunks. Maintained by the ingestion repository: chunk_count is set when
+-- the document is inserted, embedded_chunk_count is bumped by the same
+-- statement that writes embeddings.
+ALTER TABLE documents
+  ADD COLUMN IF NOT EXISTS chunk_count integer NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS embedded_chunk_count integer NOT NULL DEFAULT 0;
+
+UPDATE documents d
+SET chunk_count = stats.chunk_count,
+    embedded_chunk_count = stats.embedded_chunk_count
+FROM (
+  SELECT
+    document_id,
+    count(*) AS chunk_count,
+    count(*) FILTER (WHERE embedding IS NOT NULL) AS embedded_chunk_count
+  FROM chunks
+  GROUP BY document_id
+) stats
+WHERE stats.document_id = d.id;
+
+-- migrate:down
+ALTER TABLE documents
+  DROP COLUMN IF EXISTS embedded_chunk_count,
+  DROP COLUMN IF EXISTS chunk_count;
@@ -0,0 +1,20 @@
+-- migrate:up
+-- Index chunk embeddings at half precision (requires pgvector >= 0.7).
+-- The column stays vector(768); only the HNSW graph stores float16 copies,
+-- which halves its size and the memory read per traversal. Queries order
+-- by `embedding::halfvec(768) <=> $n::halfvec(768)` to use it and re-rank
+-- the returned candidates at full precision.
+CREATE INDEX IF NOT EXISTS chunks_embedding_halfvec_hnsw_cosine_idx
+  ON chunks
+  USING hnsw ((embedding::halfvec(768)) halfvec_cosine_ops)
+  WHERE embedding IS NOT NULL;
+
+DROP INDEX IF EXISTS chunks_embedding_hnsw_cosine_idx;
+
+-- migrate:down
+CREATE INDEX IF NOT EXISTS chunks_embedding_hnsw_cosine_idx
+  ON chunks
+  USING hnsw (embedding vector_cosine_ops)
+  WHERE embedding IS NOT NULL;
+
+DROP INDEX IF EXISTS chunks_embedding_halfvec_hnsw_cosine_idx;
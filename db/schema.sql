@@ -130,7 +130,9 @@ CREATE TABLE public.documents (
     metadata jsonb DEFAULT '{}'::jsonb NOT NULL,
     created_at timestamp with time zone DEFAULT now() NOT NULL,
     user_id bigint,
-    deleted_at timestamp with time zone
+    deleted_at timestamp with time zone,
+    chunk_count integer DEFAULT 0 NOT NULL,
+    embedded_chunk_count integer DEFAULT 0 NOT NULL
 );
 
 
@@ -153,6 +155,18 @@ CREATE SEQUENCE public.documents_id_seq
 ALTER SEQUENCE public.documents_id_seq OWNED BY public.documents.id;
 
 
+--
+-- Name: embedding_cache; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.embedding_cache (
+    hash bytea NOT NULL,
+    model text NOT NULL,
+    embedding public.vector(768) NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL
+);
+
+
 --
 -- Name: llm_models; Type: TABLE; Schema: public; Owner: -
 --
@@ -406,6 +420,14 @@ ALTER TABLE ONLY public.documents
     ADD CONSTRAINT documents_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: embedding_cache embedding_cache_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.embedding_cache
+    ADD CONSTRAINT embedding_cache_pkey PRIMARY KEY (hash);
+
+
 --
 -- Name: llm_models llm_models_name_key; Type: CONSTRAINT; Schema: public; Owner: -
 --
@@ -470,10 +492,10 @@ CREATE INDEX chunks_document_id_idx ON public.chunks USING btree (document_id);
 
 
 --
--- Name: chunks_embedding_hnsw_cosine_idx; Type: INDEX; Schema: public; Owner: -
+-- Name: chunks_embedding_halfvec_hnsw_cosine_idx; Type: INDEX; Schema: public; Owner: -
 --
 
-CREATE INDEX chunks_embedding_hnsw_cosine_idx ON public.chunks USING hnsw (embedding public.vector_cosine_ops) WHERE (embedding IS NOT NULL);
+CREATE INDEX chunks_embedding_halfvec_hnsw_cosine_idx ON public.chunks USING hnsw (((embedding)::public.halfvec(768)) public.halfvec_cosine_ops) WHERE (embedding IS NOT NULL);
 
 
 --
@@ -547,10 +569,10 @@ CREATE INDEX messages_content_trgm_idx ON public.messages USING gin (lower(conte
 
 
 --
--- Name: messages_conversation_id_created_at_idx; Type: INDEX; Schema: public; Owner: -
+-- Name: messages_conversation_created_id_idx; Type: INDEX; Schema: public; Owner: -
 --
 
-CREATE INDEX messages_conversation_id_created_at_idx ON public.messages USING btree (conversation_id, created_at);
+CREATE INDEX messages_conversation_created_id_idx ON public.messages USING btree (conversation_id, created_at DESC, id DESC);
 
 
 --
@@ -655,4 +677,8 @@ INSERT INTO public.schema_migrations (version) VALUES
     ('20260216193000'),
     ('20260216194500'),
     ('20260216200000'),
-    ('20260216213000');
+    ('20260216213000'),
+    ('20260217100000'),
+    ('20260218090000'),
+    ('20260218100000'),
+    ('20260218110000');